@@ -1,35 +1,204 @@
 from flask import (
-    Flask, render_template, request, redirect,
-    url_for, abort, session, flash
+    Flask, render_template, request, redirect, make_response,
+    url_for, abort, session, flash, send_file, send_from_directory, jsonify, current_app, g, stream_with_context,
 )
+from flask.cli import AppGroup
+from flask.signals import before_render_template, template_rendered
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy import bindparam, cast, column, delete, event, func, inspect, text, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.exc import StaleDataError
 from werkzeug.security import generate_password_hash, check_password_hash
-from werkzeug.utils import secure_filename
+from werkzeug.local import LocalProxy
+from werkzeug.utils import safe_join, secure_filename
+import hashlib
+import hmac
+import json
 import os
 import uuid
-from datetime import datetime
+import io
+import threading
+import time
+from datetime import datetime, timedelta
 from functools import wraps
+import cardschema
+import catalog
+import config
+import exports
+import jobs
+import metrics
+import migrations
+from cache import make_cache
+from blobstore import BlobStore, is_blob_ref
+import render
+import search
+import avatars
+from PIL import Image
 import random
+import click
 
-app = Flask(__name__)
-
-# Production-safe upload directory
-UPLOAD_FOLDER = 'uploads/profile_pics'
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = 5 * 1024 * 1024  # 5MB max file size
+THUMBNAIL_MAX_AGE = 365 * 24 * 3600
+STATIC_MAX_AGE = 365 * 24 * 3600
+BLOB_GRACE_SECONDS = 24 * 3600  # unreferenced uploads are kept this long before GC
+BLOB_GC_INTERVAL = 3600  # how often the job worker sweeps unreferenced blobs
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+IMAGE_MIME_TYPES = {'image/png', 'image/jpeg', 'image/gif', 'image/webp'}
+
+
+class RoutingSession(Session):
+    """Sends SELECTs from ``@read_only`` views to the "replica" bind, when one is configured."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (
+            bind is None
+            and not self._flushing
+            and getattr(clause, "is_select", False)
+            and g and g.get("read_replica")
+            and "replica" in self._db.engines
+        ):
+            return self._db.engines["replica"]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+cache = LocalProxy(lambda: current_app.extensions["cardhub_cache"])
+fragments = LocalProxy(lambda: current_app.extensions["cardhub_fragments"])
+blobs = LocalProxy(lambda: current_app.extensions["cardhub_blobs"])
+
+# (rule, view, options) collected by @route and registered in create_app()
+routes = []
+
+
+def route(rule, **options):
+    def decorator(f):
+        routes.append((rule, f, options))
+        return f
+    return decorator
+
+
+def read_only(f):
+    """Let the view read from the replica; it may lag behind the primary slightly."""
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        g.read_replica = True
+        return f(*args, **kwargs)
+    return wrapper
 
-os.makedirs(os.path.join(app.static_folder or 'static', UPLOAD_FOLDER), exist_ok=True)
 
-app.secret_key = "super-secret-cardhub-key"
+CONTENT_VERSIONS_SQL = text("SELECT name, version FROM content_versions").columns(column("name"), column("version"))
 
-BASE_DIR = os.path.abspath(os.path.dirname(__file__))
-db_path = os.path.join(BASE_DIR, "cardhub.db")
 
-app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{db_path}"
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+def content_versions():
+    """Change counters for the templates and reviews tables, bumped by triggers on every write."""
+    return dict(db.session.execute(CONTENT_VERSIONS_SQL).all())
+
+
+def build_token(app):
+    """Hash of every template and static file, so each deploy gets fresh page validators.
+
+    Computed once at startup; user uploads under static/ are content, not build, and are skipped.
+    """
+    uploads = os.path.join(app.static_folder, app.config["UPLOAD_FOLDER"])
+    digest = hashlib.sha256()
+    for root in (os.path.join(app.root_path, app.template_folder), app.static_folder):
+        for dirpath, dirnames, filenames in os.walk(root):
+            if os.path.commonpath([dirpath, uploads]) == uploads:
+                dirnames[:] = []
+                continue
+            dirnames.sort()
+            for name in sorted(filenames):
+                path = os.path.join(dirpath, name)
+                digest.update(os.path.relpath(path, app.root_path).encode("utf-8") + b"\0")
+                with open(path, "rb") as fh:
+                    for chunk in iter(lambda: fh.read(65536), b""):
+                        digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def page_etag(*parts):
+    # Signed-in visitors see a different nav, so they get their own validator
+    key = json.dumps(
+        [current_app.config["BUILD_TOKEN"], request.full_path, bool(session.get("user_id")), *parts], default=str,
+    )
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+
+def conditional(validator):
+    """Answer 304 without running the view when the client's ETag still matches.
+
+    ``validator(**view_args)`` returns whatever the page depends on (row
+    versions, content counters); it must be much cheaper than the view itself.
+    """
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            etag = page_etag(validator(**kwargs))
+            # Pending flash messages are rendered into the page, so it has to be built
+            if not session.get("_flashes") and request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(f(*args, **kwargs))
+            response.set_etag(etag)
+            response.cache_control.no_cache = True
+            if session.get("user_id"):
+                response.cache_control.private = True
+            else:
+                response.cache_control.public = True
+            return response
+        return wrapper
+    return decorator
+
+
+def template_version(template_id):
+    # Review aggregates live on the row, so a new review changes it too
+    tpl = db.session.get(Template, template_id)
+    return template_row(tpl) if tpl else None
+
+
+_static_versions = {}
+
+
+def static_version(filename):
+    """Short content hash of a static file, recomputed only when the file changes."""
+    path = safe_join(current_app.static_folder, filename)
+    try:
+        stat = os.stat(path)
+    except (OSError, TypeError):
+        return None
+    cached = _static_versions.get(path)
+    if cached and cached[0] == (stat.st_mtime_ns, stat.st_size):
+        return cached[1]
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(65536), b""):
+            digest.update(chunk)
+    version = digest.hexdigest()[:12]
+    _static_versions[path] = ((stat.st_mtime_ns, stat.st_size), version)
+    return version
+
+
+def static_url_defaults(endpoint, values):
+    # url_for('static', ...) gets ?v=<content hash>, so every deploy busts exactly the files that changed
+    if endpoint == "static" and "v" not in values:
+        version = static_version(values.get("filename"))
+        if version:
+            values["v"] = version
+
+
+def static_file(filename):
+    # Only the URL carrying the current hash is immutable; bare or outdated URLs revalidate
+    versioned = bool(request.args.get("v")) and request.args["v"] == static_version(filename)
+    response = send_from_directory(current_app.static_folder, filename, max_age=STATIC_MAX_AGE if versioned else None)
+    if versioned:
+        response.cache_control.immutable = True
+    return response
 
-db = SQLAlchemy(app)
 
 def datetimefilter(value, fmt='%Y-%m-%d %H:%M:%S'):
     """Jinja2 filter to format datetime objects."""
@@ -74,11 +243,6 @@ def ago(value):
         years = delta.days // 365
         return f"{years} year{'s' if years > 1 else ''} ago"
 
-# Register filters
-app.jinja_env.filters['datetimefilter'] = datetimefilter
-app.jinja_env.filters['ago'] = ago
-
-
 
 class User(db.Model):
     __tablename__ = "users"
@@ -98,6 +262,16 @@ class User(db.Model):
 
 class Template(db.Model):
     __tablename__ = "templates"
+    __table_args__ = (
+        # Ranking indexes for /discover (scanned backwards for DESC order)
+        db.Index("ix_templates_trending", "rating", "likes", "id"),
+        db.Index("ix_templates_likes", "likes", "id"),
+        db.Index("ix_templates_review_count", "review_count", "id"),
+        # Category filter + keyset pagination in /templates
+        db.Index("ix_templates_category", "category", "id"),
+        # Catalog imports upsert by name
+        db.Index("ux_templates_name", "name", unique=True),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120), nullable=False)
@@ -113,14 +287,48 @@ class Template(db.Model):
     rating = db.Column(db.Float, default=4.7)
     review_count = db.Column(db.Integer, default=0)
 
+    # Running aggregate over real reviews, maintained on insert so listing
+    # pages never have to scan the reviews table.
+    rating_sum = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    rating_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+
     reviews = db.relationship("Review", backref="template", lazy=True)
 
     def __repr__(self):
         return f"<Template {self.name}>"
 
+    @property
+    def sample_comment(self):
+        return REVIEW_SNIPPETS[self.id % len(REVIEW_SNIPPETS)]
+
+    def record_review(self, rating):
+        """Fold one new review into the running aggregate.
+
+        Issued as a single UPDATE evaluated by the database, so concurrent
+        reviews from different workers can't overwrite each other's counts.
+        Commit it in the same transaction as the Review insert.
+        """
+        new_count = Template.rating_count + 1
+        new_sum = Template.rating_sum + rating
+        db.session.execute(
+            update(Template)
+            .where(Template.id == self.id)
+            .values(
+                rating_count=new_count,
+                rating_sum=new_sum,
+                review_count=new_count,
+                rating=func.round(cast(new_sum, db.Float) / new_count, 1),
+            )
+            .execution_options(synchronize_session=False)
+        )
+
 
 class Card(db.Model):
     __tablename__ = "cards"
+    __table_args__ = (
+        # A user's cards, newest first, on /profile
+        db.Index("ix_cards_user_created", "user_id", "created_at", "id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
@@ -153,9 +361,20 @@ class Card(db.Model):
     line1_top = db.Column(db.Integer, nullable=True, default=230)
     line2_top = db.Column(db.Integer, nullable=True, default=300)
 
+    # Bumped by every UPDATE; the editor API's ETag, so stale autosaves are refused
+    version = db.Column(db.Integer, nullable=False, default=1)
+    __mapper_args__ = {"version_id_col": version}
+
+    template = db.relationship("Template")
+
 
 class Review(db.Model):
     __tablename__ = "reviews"
+    __table_args__ = (
+        db.Index("ix_reviews_template_created", "template_id", "created_at"),
+        db.Index("ix_reviews_user_created", "user_id", "created_at", "id"),
+        db.Index("ix_reviews_created", "created_at"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=True)
@@ -166,11 +385,48 @@ class Review(db.Model):
     display_name = db.Column(db.String(80), nullable=True)
 
 
+class Blob(db.Model):
+    __tablename__ = "blobs"
+
+    hash = db.Column(db.String(64), primary_key=True)
+    mime_type = db.Column(db.String(40), nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    last_uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
 def current_user():
+    """The logged-in User row, loaded at most once per request."""
     uid = session.get("user_id")
     if not uid:
         return None
-    return db.session.get(User, uid)
+    if "current_user" not in g:
+        g.current_user = db.session.get(User, uid)
+    return g.current_user
+
+
+def user_identity(user):
+    # What page chrome needs; no email or password hash, and cheap to cache
+    return {"id": user.id, "username": user.username, "profile_pic": user.profile_pic}
+
+
+def current_identity():
+    """``user_identity`` of the logged-in user from the cache, so most views never read the users table."""
+    uid = session.get("user_id")
+    if not uid:
+        return None
+    if "identity" not in g:
+        def load():
+            user = current_user()
+            return user_identity(user) if user else None
+        g.identity = cache.get_or_set(f"user:{uid}", load)
+    return g.identity
+
+
+def remember_identity(user):
+    """Refresh the cached identity after a login or a profile change."""
+    g.identity = user_identity(user)
+    cache.set(f"user:{user.id}", g.identity)
 
 
 def login_required(f):
@@ -199,26 +455,136 @@ REVIEW_NAMES = [
 ]
 
 
-def attach_meta(templates):
-    for t in templates:
-        base_likes = t.likes or random.randint(35, 220)
-        base_reviews = t.review_count or random.randint(4, 45)
-        base_rating = t.rating or round(random.uniform(4.2, 4.9), 1)
+def placeholder_stats(template_id):
+    """Stable stand-in likes/review count/rating for a template with no real numbers."""
+    rng = random.Random(template_id)
+    return {
+        "likes": rng.randint(35, 220),
+        "review_count": rng.randint(4, 45),
+        "rating": round(rng.uniform(4.2, 4.9), 1),
+    }
+
+
+@event.listens_for(Template, "after_insert")
+def materialize_placeholder_stats(mapper, connection, target):
+    # Fill empty stats once, at insert time, so listing pages stay stable
+    # between requests instead of re-rolling random numbers per view.
+    values = {k: v for k, v in placeholder_stats(target.id).items() if not getattr(target, k)}
+    if not values:
+        return
+    connection.execute(update(Template).where(Template.id == target.id).values(**values))
+    for key, value in values.items():
+        set_committed_value(target, key, value)
+
+
+def get_categories():
+    """Distinct template categories, cached until a template is added or recategorized."""
+    return cache.get_or_set("categories", lambda: [
+        c[0] for c in db.session.query(Template.category).distinct().order_by(Template.category)
+    ])
+
+
+def invalidate_categories():
+    cache.delete("categories")
+
+
+def invalidate_home():
+    """Drop the cached home page listings."""
+    cache.delete("home:templates")
+
+
+def template_row(t):
+    # Plain dict so cached listings never hold on to session-bound ORM objects
+    return {c.key: getattr(t, c.key) for c in Template.__table__.columns}
+
+
+@event.listens_for(Template, "after_insert")
+@event.listens_for(Template, "after_delete")
+def _template_categories_changed(mapper, connection, target):
+    invalidate_categories()
+    invalidate_home()
 
-        real_reviews = t.reviews
-        if real_reviews:
-            base_reviews = len(real_reviews)
-            base_rating = round(sum(r.rating for r in real_reviews) / len(real_reviews), 1)
 
-        t.dynamic_likes = base_likes
-        t.dynamic_reviews = base_reviews
-        t.dynamic_rating = base_rating
-        t.sample_comment = random.choice(REVIEW_SNIPPETS)
+@event.listens_for(Template, "after_update")
+def _template_maybe_recategorized(mapper, connection, target):
+    if inspect(target).attrs.category.history.has_changes():
+        invalidate_categories()
+
+
+def review_totals():
+    """Per-template (count, sum) of real review ratings, as a subquery."""
+    return (
+        db.session.query(
+            Review.template_id.label("template_id"),
+            func.count(Review.id).label("count"),
+            func.sum(Review.rating).label("total"),
+        )
+        .group_by(Review.template_id)
+        .subquery()
+    )
+
+
+def stats_update(template_id, count, total, likes=None, review_count=None, rating=None):
+    """Build the bulk-update row that brings one template's stats in line with its reviews."""
+    row = {"id": template_id, "rating_count": count, "rating_sum": total}
+    if count:
+        # Real reviews replace the seeded placeholder numbers
+        row["review_count"] = count
+        row["rating"] = round(total / count, 1)
+    # Rows written without the ORM (e.g. bulk inserts) skip the
+    # after_insert hook, so fill any stats still left empty.
+    current = {"likes": likes, "review_count": row.get("review_count", review_count), "rating": row.get("rating", rating)}
+    for key, value in placeholder_stats(template_id).items():
+        if not current[key]:
+            row[key] = value
+    return row
+
+
+def backfill_template_stats():
+    """Recompute the denormalized review stats for every template in one pass."""
+    totals = review_totals()
+    rows = db.session.query(
+        Template.id, func.coalesce(totals.c.count, 0), func.coalesce(totals.c.total, 0),
+        Template.likes, Template.review_count, Template.rating,
+    ).outerjoin(totals, totals.c.template_id == Template.id)
+    updates = [stats_update(*row) for row in rows]
+
+    if updates:
+        db.session.execute(update(Template), updates)
+    db.session.commit()
+    return len(updates)
+
+
+def reconcile_template_stats(repair=False):
+    """Find templates whose running rating aggregate drifted from the reviews table.
+
+    Returns ``(template_id, stored_count, stored_sum, actual_count, actual_sum)``
+    tuples; with ``repair`` the drifted rows are rewritten in one bulk update.
+    """
+    totals = review_totals()
+    actual_count = func.coalesce(totals.c.count, 0)
+    actual_sum = func.coalesce(totals.c.total, 0)
+    rows = (
+        db.session.query(
+            Template.id, Template.rating_count, Template.rating_sum, actual_count, actual_sum,
+            Template.likes, Template.review_count, Template.rating,
+        )
+        .outerjoin(totals, totals.c.template_id == Template.id)
+        .filter((Template.rating_count != actual_count) | (Template.rating_sum != actual_sum))
+        .all()
+    )
+    if repair and rows:
+        db.session.execute(update(Template), [
+            stats_update(template_id, count, total, likes, review_count, rating)
+            for template_id, _, _, count, total, likes, review_count, rating in rows
+        ])
+        db.session.commit()
+    return [tuple(row[:5]) for row in rows]
 
 
 def seed_data():
     if Template.query.count() > 0:
-        return
+        return 0
 
     demo_templates = [
         Template(
@@ -485,98 +851,787 @@ def seed_data():
 
     db.session.add_all(demo_templates)
     db.session.commit()
+    return len(demo_templates)
+
+
+def install_sqlite_pragmas():
+    pragmas = config.SQLITE_PROFILES[current_app.config["CARDHUB_DB_PROFILE"]]
+    if not pragmas:
+        return
+    # Primary and replica alike
+    for engine in db.engines.values():
+        if engine.dialect.name == "sqlite":
+            event.listen(engine, "connect", lambda conn, record: config.apply_sqlite_pragmas(conn, pragmas))
+
+
+def _sql_started(conn, cursor, statement, parameters, context, executemany):
+    conn.info["query_started"] = time.perf_counter()
+
+
+def _sql_finished(conn, cursor, statement, parameters, context, executemany):
+    # Attributed to the current request; CLI commands and jobs are not measured
+    started = conn.info.pop("query_started", None)
+    if started is not None and g and "sql_statements" in g:
+        g.sql_statements += 1
+        g.sql_seconds += time.perf_counter() - started
+
+
+def install_sql_metrics():
+    for engine in db.engines.values():
+        event.listen(engine, "before_cursor_execute", _sql_started)
+        event.listen(engine, "after_cursor_execute", _sql_finished)
+
+
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    g.sql_statements = 0
+    g.sql_seconds = 0.0
+
+
+def record_request_metrics(response):
+    if "request_started" not in g:
+        return response
+    # Endpoint names, never raw paths, so label cardinality stays bounded
+    endpoint = request.endpoint or "unmatched"
+    metrics.inc("cardhub_requests_total", endpoint=endpoint, method=request.method, status=response.status_code)
+    metrics.observe("cardhub_request_duration_seconds", time.perf_counter() - g.request_started, endpoint=endpoint)
+    metrics.observe("cardhub_request_sql_statements", g.sql_statements, endpoint=endpoint)
+    metrics.inc("cardhub_sql_duration_seconds_total", g.sql_seconds, endpoint=endpoint)
+    return response
+
+
+def _template_started(sender, template, context, **extra):
+    g.setdefault("render_started", []).append(time.perf_counter())
+
+
+def _template_finished(sender, template, context, **extra):
+    started = g.get("render_started")
+    if started:
+        elapsed = time.perf_counter() - started.pop()
+        metrics.observe("cardhub_template_render_seconds", elapsed, template=template.name or "(string)")
+
+
+def record_cache_lookup(key, hit):
+    metrics.inc("cardhub_cache_requests_total", cache=key.split(":", 1)[0], result="hit" if hit else "miss")
+
+
+IMPORT_BATCH_SIZE = 5000
+# Dialects whose INSERT supports ON CONFLICT DO UPDATE ... RETURNING
+UPSERT_INSERTS = {"sqlite": sqlite_insert, "postgresql": postgresql_insert}
+
+
+def upsert_templates(rows):
+    """Insert or update (by name) one batch of catalog rows in a single statement per column set."""
+    groups = {}
+    for row in rows:
+        groups.setdefault(tuple(sorted(row)), []).append(row)
+    dialect = db.session.get_bind().dialect.name
+    if dialect not in UPSERT_INSERTS:
+        raise NotImplementedError(f"No template upsert for {dialect}")
+    stats = []
+    for keys, group in groups.items():
+        stmt = UPSERT_INSERTS[dialect](Template.__table__)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["name"],
+            # Catalog fields only; likes/ratings/review aggregates stay as they are
+            set_={key: stmt.excluded[key] for key in keys if key != "name"},
+        ).returning(Template.id, Template.likes, Template.review_count, Template.rating)
+        stats.extend(db.session.execute(stmt, group).all())
+
+    # Core inserts skip the after_insert hook, so give new rows their placeholder stats here
+    fills = {}
+    for row in stats:
+        values = {k: v for k, v in placeholder_stats(row.id).items() if not getattr(row, k)}
+        if values:
+            fills.setdefault(tuple(sorted(values)), []).append({"row_id": row.id, **values})
+    for keys, params in fills.items():
+        stmt = (
+            update(Template.__table__)
+            .where(Template.id == bindparam("row_id"))
+            .values({key: bindparam(key) for key in keys})
+        )
+        db.session.execute(stmt, params)
+    return len(stats)
+
+
+def import_templates(rows, batch_size=IMPORT_BATCH_SIZE):
+    """Stream ``rows`` (see catalog.py) into the templates table; returns how many were upserted."""
+    total, batch = 0, {}
+    for row in rows:
+        # Last one wins when a name repeats within a batch
+        batch[row["name"]] = row
+        if len(batch) >= batch_size:
+            total += upsert_templates(batch.values())
+            db.session.commit()
+            batch = {}
+    if batch:
+        total += upsert_templates(batch.values())
+        db.session.commit()
+    invalidate_categories()
+    invalidate_home()
+    return total
+
+
+# flask cardhub <command>; the app itself never touches the database at startup
+cli = AppGroup("cardhub", help="CardHub database and maintenance commands.")
+
+
+@cli.command("import-templates")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "fmt", type=click.Choice(sorted(catalog.READERS)), help="Defaults to the file extension.")
+@click.option("--batch-size", type=int, default=IMPORT_BATCH_SIZE, show_default=True)
+def import_templates_command(path, fmt, batch_size):
+    """Upsert templates by name from a markdown, CSV or JSONL catalog."""
+    try:
+        count = import_templates(catalog.read_catalog(path, fmt), batch_size)
+    except catalog.CatalogError as exc:
+        raise click.ClickException(str(exc))
+    click.echo(f"Imported {count} templates.")
+
+
+@cli.command("backfill-stats")
+def backfill_stats_command():
+    """Rebuild the denormalized review stats on every template."""
+    count = backfill_template_stats()
+    click.echo(f"Backfilled stats for {count} templates.")
+
+
+@cli.command("reconcile-stats")
+@click.option("--repair", is_flag=True, help="Rewrite drifted aggregates instead of only reporting them.")
+def reconcile_stats_command(repair):
+    """Verify template rating aggregates against the reviews table."""
+    drifted = reconcile_template_stats(repair=repair)
+    for template_id, stored_count, stored_sum, count, total in drifted:
+        click.echo(f"template {template_id}: stored {stored_count}/{stored_sum}, actual {count}/{total}")
+    verb = "Repaired" if repair else "Found"
+    click.echo(f"{verb} {len(drifted)} drifted templates.")
+
+
+@cli.command("migrate-bg-images")
+def migrate_bg_images_command():
+    """Move inline data-URL card backgrounds into the blob store."""
+    moved = 0
+    for card in Card.query.filter(Card.bg_image.like("%data:%")).yield_per(100):
+        digest = card_background(card.bg_image)
+        card.bg_image = digest
+        retain_blob(digest)
+        moved += 1
+    db.session.commit()
+    click.echo(f"Moved {moved} card backgrounds into the blob store.")
+
+
+@cli.command("gc-blobs")
+def gc_blobs_command():
+    """Delete uploaded backgrounds that no card references."""
+    click.echo(f"Deleted {purge_blobs()} unreferenced blobs.")
+
+
+@cli.command("init-db")
+@click.option("--status", is_flag=True, help="List pending migrations without applying them.")
+def init_db_command(status):
+    """Create the schema and apply pending migrations."""
+    if status:
+        for version, name in migrations.pending(db.engine):
+            click.echo(f"pending {version:04d} {name}")
+        return
+    for version, name in migrations.upgrade(db.engine, db.metadata):
+        click.echo(f"applied {version:04d} {name}")
+
+
+@cli.command("seed")
+def seed_command():
+    """Insert the demo templates into an empty database."""
+    click.echo(f"Seeded {seed_data()} templates.")
+
+
+@cli.command("worker")
+@click.option("--burst", is_flag=True, help="Exit once no job is due instead of polling.")
+@click.option("--poll-interval", type=float, default=jobs.POLL_INTERVAL, show_default=True)
+@click.option("--visibility-timeout", type=int, default=jobs.VISIBILITY_TIMEOUT, show_default=True,
+              help="Seconds a claimed job stays hidden before another worker may retry it.")
+def worker_command(burst, poll_interval, visibility_timeout):
+    """Run queued background jobs until stopped."""
+    app = current_app._get_current_object()
+
+    def run(job):
+        # A fresh app context per job, so every job gets its own session
+        with app.app_context():
+            jobs.TASKS[job.kind](**job.payload)
+
+    def sweep_caches():
+        # File caches are only trimmed here; memory caches bound themselves
+        removed = sum(app.extensions[name].sweep() for name in ("cardhub_cache", "cardhub_fragments"))
+        if removed:
+            click.echo(f"swept {removed} cache entries")
+
+    def collect_blobs():
+        # Also catches uploads that no card ever referenced, which no release schedules
+        with app.app_context():
+            removed = purge_blobs()
+        if removed:
+            click.echo(f"deleted {removed} unreferenced blobs")
+
+    periodic = [(app.config["CACHE_SWEEP_INTERVAL"], sweep_caches), (BLOB_GC_INTERVAL, collect_blobs)]
+    done = jobs.work(db.engine, run, visibility_timeout, poll_interval, burst, log=click.echo, periodic=periodic)
+    click.echo(f"Ran {done} jobs.")
+
+
+@cli.command("jobs")
+@click.option("--requeue-failed", is_flag=True, help="Give failed jobs a fresh set of attempts.")
+def jobs_command(requeue_failed):
+    """Show the background job queue."""
+    if requeue_failed:
+        click.echo(f"Requeued {jobs.requeue_failed(db.engine)} failed jobs.")
+    for state, count in sorted(jobs.counts(db.engine).items()):
+        click.echo(f"{state}: {count}")
+    for job in jobs.failed(db.engine):
+        click.echo(f"failed job {job.id} {job.kind} after {job.attempts} attempts: {job.last_error.strip().splitlines()[-1]}")
+
+
+def hot_queries():
+    """The queries behind the busiest routes, built by the views' own helpers with representative parameters."""
+    review_cursor = [datetime(2026, 1, 1), 1000]
+    template_reviews = Review.query.filter_by(template_id=1)
+    queries = {
+        "profile cards": profile_cards(1).limit(PROFILE_PAGE_SIZE),
+        "profile reviews": profile_reviews(1).limit(PROFILE_PAGE_SIZE),
+        "reviews feed": review_feed(Review.query, None),
+        "reviews feed next page": review_feed(Review.query, review_cursor),
+        "template reviews feed": review_feed(template_reviews, None),
+        "template reviews feed next page": review_feed(template_reviews, review_cursor),
+        "new reviews poll": newer_reviews(Review.query, review_cursor),
+        "template new reviews poll": newer_reviews(template_reviews, review_cursor),
+        "templates_gallery next page": gallery_query(None, 1, 24),
+        "templates_gallery category": gallery_query("Birthday", 1, 24),
+    }
+    for mode, (_, columns) in DISCOVER_MODES.items():
+        sort_key = [*columns, Template.id]
+        queries[f"discover {mode}"] = discover_query(sort_key, None)
+        queries[f"discover {mode} next page"] = discover_query(sort_key, [4.5, 100, 1000][-len(sort_key):])
+    return queries
+
+
+def query_plan_problems(query):
+    """Table scans and unindexed sorts in the SQLite plan for ``query``, as plan detail strings."""
+    statement = query.statement
+    sql = statement.compile(db.engine, compile_kwargs={"literal_binds": True})
+    plan = db.session.execute(text(f"EXPLAIN QUERY PLAN {sql}")).all()
+    # Walking an index in order is fine for an unfiltered, LIMITed listing;
+    # a filtered query should SEARCH instead.
+    filtered = statement.whereclause is not None
+    return [
+        detail for *_, detail in plan
+        if (detail.startswith("SCAN ") and (filtered or " USING " not in detail))
+        or detail.startswith("USE TEMP B-TREE")
+    ]
+
+
+def count_statements(path, user_id):
+    """Run GET ``path`` as ``user_id`` through the test client and return the SQL statements it issued."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    client = current_app.test_client()
+    with client.session_transaction() as client_session:
+        client_session["user_id"] = user_id
+    for engine in db.engines.values():
+        event.listen(engine, "before_cursor_execute", record)
+    try:
+        # A fresh app context, so the request gets its own g and session
+        with current_app.app_context():
+            response = client.get(path)
+    finally:
+        for engine in db.engines.values():
+            event.remove(engine, "before_cursor_execute", record)
+    if response.status_code != 200:
+        raise click.ClickException(f"GET {path} answered {response.status_code}.")
+    return statements
+
+
+@cli.command("check-query-plans")
+def check_query_plans_command():
+    """Fail if any hot route query scans a whole table or sorts without an index, or /profile runs over budget."""
+    if db.engine.dialect.name != "sqlite":
+        raise click.ClickException("Query plans are read with SQLite's EXPLAIN QUERY PLAN; point this at a SQLite copy.")
+    failed = 0
+    for name, query in hot_queries().items():
+        problems = query_plan_problems(query)
+        failed += bool(problems)
+        click.echo(f"{'FAIL' if problems else 'ok':<5} {name}" + "".join(f"\n      {p}" for p in problems))
+
+    # The user with the most cards is where a per-row query would show
+    user_id = (
+        db.session.query(Card.user_id).group_by(Card.user_id).order_by(func.count().desc()).limit(1).scalar()
+        or db.session.query(func.min(User.id)).scalar()
+    )
+    if user_id is None:
+        click.echo("skip  profile statement budget (no users)")
+    else:
+        statements = count_statements("/profile", user_id)
+        over = len(statements) > PROFILE_STATEMENT_BUDGET
+        failed += over
+        click.echo(f"{'FAIL' if over else 'ok':<5} profile statements: {len(statements)} of {PROFILE_STATEMENT_BUDGET}")
+    if failed:
+        raise click.ClickException(f"{failed} checks failed.")
+
+
+def store_blob(data):
+    """Validate image bytes, store them once and return the blob hash (or None)."""
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image.verify()
+            mime_type = Image.MIME.get(image.format)
+    except Exception:
+        return None
+    if mime_type not in IMAGE_MIME_TYPES:
+        return None
+
+    digest = blobs.put(data)
+    record = db.session.get(Blob, digest)
+    if record is None:
+        db.session.add(Blob(hash=digest, mime_type=mime_type, size=len(data)))
+    else:
+        record.last_uploaded_at = datetime.utcnow()
+    return digest
+
+
+def retain_blob(digest):
+    if is_blob_ref(digest):
+        db.session.execute(update(Blob).where(Blob.hash == digest).values(ref_count=Blob.ref_count + 1))
+
+
+def release_blob(digest):
+    if is_blob_ref(digest):
+        db.session.execute(update(Blob).where(Blob.hash == digest).values(ref_count=Blob.ref_count - 1))
+        # Checked again once the upload grace period is over; a no-op if it was taken back
+        jobs.enqueue(db.session, "purge_blobs", delay=BLOB_GRACE_SECONDS + 60, digests=[digest])
+
+
+def purge_blobs(*digests):
+    """Delete blobs nobody references any more and nobody uploaded recently."""
+    cutoff = datetime.utcnow() - timedelta(seconds=BLOB_GRACE_SECONDS)
+    # The condition lives in the DELETE itself, so a retain or re-upload that
+    # commits first keeps its row, and only files of deleted rows are unlinked.
+    stmt = delete(Blob).where(Blob.ref_count <= 0, Blob.last_uploaded_at < cutoff)
+    if digests:
+        stmt = stmt.where(Blob.hash.in_([d for d in digests if is_blob_ref(d)]))
+    doomed = db.session.scalars(stmt.returning(Blob.hash)).all()
+    db.session.commit()
+    for digest in doomed:
+        # Uploaded again since the DELETE: the new row owns the file
+        if db.session.get(Blob, digest) is None:
+            blobs.delete(digest)
+    return len(doomed)
+
+
+@jobs.task("purge_blobs")
+def purge_blobs_task(digests):
+    # Never an empty list: purge_blobs() with no digests sweeps every unreferenced blob
+    if digests:
+        purge_blobs(*digests)
+
+
+@jobs.task("render_thumbnails")
+def render_thumbnails_task(kind, obj_id):
+    """Pre-render the gallery/profile thumbnails so the first view is a cache hit."""
+    obj = db.session.get(Card if kind == "card" else Template, obj_id)
+    if obj is None:
+        return
+    for size in ("sm", "md"):
+        render.cached_render(obj, current_app.config["THUMBNAIL_DIR"], size, "webp", image_loader=load_background)
+
+
+def card_background(value):
+    """Normalise a posted bg_image into a blob hash, moving inline data URLs into the store."""
+    if is_blob_ref(value):
+        return value if db.session.get(Blob, value) else None
+    data = render.decode_data_url(value)
+    if data:
+        return store_blob(data)
+    return None
 
 
-with app.app_context():
-    db.create_all()
-    seed_data()
+def load_background(value):
+    # image_loader for render: blob refs from the store, legacy data URLs inline
+    if is_blob_ref(value):
+        return blobs.read(value)
+    return render.decode_data_url(value)
+
+
+def bg_image_url(value):
+    if is_blob_ref(value):
+        return url_for("blob", digest=value)
+    return value
+
+
+def thumb_url(obj, size="md", fmt="webp"):
+    """URL of the pre-rendered image for a Template or Card; changes whenever its style does."""
+    kind = "card" if isinstance(obj, Card) else "template"
+    version = render.style_hash(render.card_style(obj))
+    return url_for("thumbnail", kind=kind, obj_id=obj.id, size=size, fmt=fmt, v=version)
+
+
+TILE_TEMPLATES = {"home": "tile_home.html", "gallery": "tile_gallery.html", "discover": "tile_discover.html"}
+
+
+def tile(t, variant):
+    """HTML of one template tile, cached under its id, a hash of its columns and the build token.
+
+    Any edit to the template's text, colours or review stats changes the hash,
+    and a deploy that touches the tile markup changes the build token, so stale
+    tiles are never served; old entries expire, and the job worker sweeps them
+    out of a file-backed cache.
+    """
+    row = t if isinstance(t, dict) else template_row(t)
+    # template_row() always lists the columns in table order, so repr() is a stable fingerprint
+    version = hashlib.sha1(repr(tuple(row.values())).encode()).hexdigest()[:16]
+    html = fragments.get_or_set(
+        f"tile:{variant}:{row['id']}:{version}:{current_app.config['BUILD_TOKEN']}",
+        lambda: current_app.jinja_env.get_template(TILE_TEMPLATES[variant]).render(t=t),
+    )
+    return Markup(html)
 
 
 # Combined context processor
-@app.context_processor
 def inject_globals():
-    user = current_user()
     return {
-        "current_user_obj": user,
+        "current_user_obj": current_identity(),
         "USER_ROLE": "free"
     }
 
 
-@app.route("/")
+@route("/")
+@read_only
+@conditional(content_versions)
 def index():
-    categories = [c[0] for c in db.session.query(Template.category).distinct().all()]
-    featured = Template.query.limit(12).all()
-    recent = Template.query.order_by(Template.id.desc()).limit(12).all()
-    attach_meta(featured + recent)
-    
-    # Calculate dynamic stats
-    total_templates = Template.query.count()
-    total_users = User.query.count()
-    total_categories = len(categories)
-    
-    stats = {
-        'total_templates': total_templates,
-        'total_users': total_users,
-        'total_categories': total_categories
-    }
-    
-    return render_template("index.html", categories=categories, featured=featured, recent=recent, stats=stats)
+    categories = get_categories()
+    listings = cache.get_or_set("home:templates", lambda: {
+        "featured": [template_row(t) for t in Template.query.limit(12)],
+        "recent": [template_row(t) for t in Template.query.order_by(Template.id.desc()).limit(12)],
+    })
+    return render_template("index.html", categories=categories, featured=listings["featured"], recent=listings["recent"])
 
 
-@app.route("/templates")
+def gallery_query(category, after, page_size):
+    """One gallery page plus a lookahead row, in id order, optionally for one category."""
+    query = Template.query
+    if category:
+        query = query.filter_by(category=category)
+    if after:
+        query = query.filter(Template.id > after)
+    return query.order_by(Template.id).limit(page_size + 1)
+
+
+@route("/templates")
+@read_only
+@conditional(lambda: content_versions()["templates"])
 def templates_gallery():
     category = request.args.get("category")
-    if category:
-        templates = Template.query.filter_by(category=category).all()
-    else:
-        templates = Template.query.all()
-    categories = [c[0] for c in db.session.query(Template.category).distinct().all()]
-    attach_meta(templates)
-    return render_template("templates_gallery.html", templates=templates, categories=categories, active_category=category)
+    page_size = current_app.config["GALLERY_PAGE_SIZE"]
+    templates = gallery_query(category, request.args.get("after", type=int), page_size).all()
+    next_cursor = None
+    if len(templates) > page_size:
+        templates = templates[:page_size]
+        next_cursor = templates[-1].id
+
+    return render_template(
+        "templates_gallery.html",
+        templates=templates,
+        categories=get_categories(),
+        active_category=category,
+        next_cursor=next_cursor,
+    )
 
 
-@app.route("/template/<int:template_id>")
+@route("/template/<int:template_id>")
+@read_only
+@conditional(template_version)
 def template_detail(template_id):
     tpl = Template.query.get_or_404(template_id)
-    attach_meta([tpl])
-    reviews = Review.query.filter_by(template_id=template_id).order_by(Review.created_at.desc()).all()
-    avg_rating = None
-    if reviews:
-        avg_rating = round(sum(r.rating for r in reviews) / len(reviews), 1)
-    return render_template("template_detail.html", template=tpl, reviews=reviews, avg_rating=avg_rating)
+    # The running aggregates on the row; the reviews themselves are paged at template_reviews
+    avg_rating = tpl.rating if tpl.rating_count else None
+    return render_template("template_detail.html", template=tpl, avg_rating=avg_rating)
+
+
+REVIEWS_PAGE_SIZE = 30
+REVIEW_SORT_KEY = (Review.created_at, Review.id)
 
 
-@app.route("/reviews")
+def review_feed(query, after):
+    """Reviews before the ``after`` cursor, newest first, plus a lookahead row."""
+    query = query.options(joinedload(Review.template)).order_by(*[col.desc() for col in REVIEW_SORT_KEY])
+    if after:
+        query = query.filter(tuple_(*REVIEW_SORT_KEY) < tuple_(*after))
+    return query.limit(REVIEWS_PAGE_SIZE + 1)
+
+
+def review_page(query):
+    """One ``?after=`` page of reviews, newest first, with their templates joined in."""
+    reviews = review_feed(query, parse_cursor(request.args.get("after"), REVIEW_SORT_KEY)).all()
+    next_cursor = None
+    if len(reviews) > REVIEWS_PAGE_SIZE:
+        reviews = reviews[:REVIEWS_PAGE_SIZE]
+        next_cursor = make_cursor(reviews[-1], REVIEW_SORT_KEY)
+    return reviews, next_cursor
+
+
+@route("/reviews")
+@read_only
+@conditional(content_versions)
 def reviews_page():
-    reviews = Review.query.order_by(Review.created_at.desc()).limit(60).all()
-    return render_template("reviews.html", reviews=reviews)
+    reviews, next_cursor = review_page(Review.query)
+    return render_template(
+        "reviews.html", reviews=reviews, template=None, after=request.args.get("after"), next_cursor=next_cursor,
+        since=make_cursor(reviews[0], REVIEW_SORT_KEY) if reviews else None,
+    )
+
+
+@route("/template/<int:template_id>/reviews")
+@read_only
+@conditional(template_version)
+def template_reviews(template_id):
+    tpl = Template.query.get_or_404(template_id)
+    reviews, next_cursor = review_page(Review.query.filter_by(template_id=template_id))
+    return render_template(
+        "reviews.html", reviews=reviews, template=tpl, after=request.args.get("after"), next_cursor=next_cursor,
+        since=make_cursor(reviews[0], REVIEW_SORT_KEY) if reviews else None,
+    )
 
 
-@app.route("/discover")
+REVIEW_POLL_SECONDS = 15  # clients back off from here while nothing new arrives
+
+
+def newer_reviews(query, since):
+    """Reviews after the ``since`` cursor, oldest first, so a poll can resume from the last one."""
+    query = query.options(joinedload(Review.template)).order_by(*REVIEW_SORT_KEY)
+    if since:
+        query = query.filter(tuple_(*REVIEW_SORT_KEY) > tuple_(*since))
+    return query.limit(REVIEWS_PAGE_SIZE)
+
+
+@route("/reviews/new")
+@read_only
+@conditional(content_versions)
+def new_reviews():
+    """Reviews posted after ``?since=``, for browsers without EventSource or turned away by review_stream.
+
+    Every poll is one indexed range read that returns at once, and an
+    unchanged feed is answered with a 304 from the content counters alone,
+    so open pages never hold a worker.
+    """
+    query = Review.query
+    template_id = request.args.get("template_id", type=int)
+    if template_id:
+        query = query.filter_by(template_id=template_id)
+    since = request.args.get("since")
+    reviews = newer_reviews(query, parse_cursor(since, REVIEW_SORT_KEY)).all()
+    item_template = current_app.jinja_env.get_template("review_item.html")
+    response = jsonify(
+        reviews=[{"id": r.id, "html": item_template.render(r=r)} for r in reviews],
+        since=make_cursor(reviews[-1], REVIEW_SORT_KEY) if reviews else since,
+        poll_seconds=REVIEW_POLL_SECONDS,
+    )
+    response.headers["Retry-After"] = str(REVIEW_POLL_SECONDS)
+    return response
+
+
+REVIEW_STREAM_SECONDS = 60  # then the browser reconnects from the last event id
+REVIEW_STREAM_POLL = 2
+
+
+@route("/reviews/stream")
+@read_only
+def review_stream():
+    """Server-Sent Events for reviews posted after ``?since=``, optionally for one template.
+
+    Each open stream holds a worker thread, so this needs the threaded (or
+    gevent) workers configured in gunicorn.conf.py. At most
+    REVIEW_STREAM_LIMIT streams run per process; the rest get a 503 and the
+    page falls back to polling new_reviews. The reviews table is the only
+    channel shared by every worker, so a stream re-runs the poll's indexed
+    range read every REVIEW_STREAM_POLL seconds, and ends after
+    REVIEW_STREAM_SECONDS to be resumed with Last-Event-ID.
+    """
+    slots = current_app.extensions["cardhub_review_streams"]
+    if not slots.acquire(blocking=False):
+        response = current_app.response_class(status=503)
+        response.headers["Retry-After"] = str(REVIEW_POLL_SECONDS)
+        return response
+    query = Review.query
+    template_id = request.args.get("template_id", type=int)
+    if template_id:
+        query = query.filter_by(template_id=template_id)
+    cursor = parse_cursor(request.headers.get("Last-Event-ID") or request.args.get("since"), REVIEW_SORT_KEY)
+    if cursor is None:
+        latest = query.order_by(*[col.desc() for col in REVIEW_SORT_KEY]).first()
+        cursor = [getattr(latest, col.key) for col in REVIEW_SORT_KEY] if latest else None
+    db.session.close()
+    item_template = current_app.jinja_env.get_template("review_item.html")
+
+    def events():
+        nonlocal cursor
+        yield f"retry: {REVIEW_STREAM_POLL * 1000}\n\n"
+        deadline = time.monotonic() + REVIEW_STREAM_SECONDS
+        while time.monotonic() < deadline:
+            chunks = []
+            for r in newer_reviews(query, cursor).all():
+                data = json.dumps({"id": r.id, "html": item_template.render(r=r)})
+                chunks.append(f"id: {make_cursor(r, REVIEW_SORT_KEY)}\nevent: review\ndata: {data}\n\n")
+                cursor = [getattr(r, col.key) for col in REVIEW_SORT_KEY]
+            # Release the connection (and the read snapshot) between reads
+            db.session.close()
+            # A comment line doubles as a keep-alive that notices closed clients
+            yield "".join(chunks) or ": keep-alive\n\n"
+            time.sleep(REVIEW_STREAM_POLL)
+
+    response = current_app.response_class(stream_with_context(events()), mimetype="text/event-stream")
+    # Runs even if the client leaves before the first event
+    response.call_on_close(slots.release)
+    response.cache_control.no_cache = True
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
+DISCOVER_PAGE_SIZE = 24
+
+DISCOVER_MODES = {
+    "trending": ("Trending templates", (Template.rating, Template.likes)),
+    "top-liked": ("Most liked templates", (Template.likes,)),
+    "most-comments": ("Most commented templates", (Template.review_count,)),
+}
+
+
+def make_cursor(row, sort_key):
+    """Encode the sort key of the last row on a page as an ``?after=`` value."""
+    return "_".join(str(getattr(row, col.key) or 0) for col in sort_key)
+
+
+def parse_cursor(value, sort_key):
+    if not value:
+        return None
+    parts = value.split("_")
+    if len(parts) != len(sort_key):
+        return None
+    try:
+        return [
+            datetime.fromisoformat(part) if col.type.python_type is datetime else col.type.python_type(part)
+            for col, part in zip(sort_key, parts)
+        ]
+    except ValueError:
+        return None
+
+
+def discover_query(sort_key, after):
+    """One /discover page plus a lookahead row, ranked by ``sort_key`` descending."""
+    query = Template.query.order_by(*[col.desc() for col in sort_key])
+    if after:
+        query = query.filter(tuple_(*sort_key) < tuple_(*after))
+    return query.limit(DISCOVER_PAGE_SIZE + 1)
+
+
+@route("/discover")
+@read_only
+@conditional(lambda: content_versions()["templates"])
 def discover():
     mode = request.args.get("mode", "trending")
-    templates = Template.query.all()
-    attach_meta(templates)
-
-    if mode == "top-liked":
-        templates_sorted = sorted(templates, key=lambda t: t.dynamic_likes, reverse=True)
-        title = "Most liked templates"
-    elif mode == "most-comments":
-        templates_sorted = sorted(templates, key=lambda t: t.dynamic_reviews, reverse=True)
-        title = "Most commented templates"
+    if mode not in DISCOVER_MODES:
+        mode = "trending"
+    title, columns = DISCOVER_MODES[mode]
+    sort_key = [*columns, Template.id]
+    templates = discover_query(sort_key, parse_cursor(request.args.get("after"), sort_key)).all()
+    next_cursor = None
+    if len(templates) > DISCOVER_PAGE_SIZE:
+        templates = templates[:DISCOVER_PAGE_SIZE]
+        next_cursor = make_cursor(templates[-1], sort_key)
+
+    return render_template("discover.html", templates=templates, mode=mode, title=title, next_cursor=next_cursor)
+
+
+SEARCH_PAGE_SIZE = 24
+
+
+@route("/search")
+@read_only
+@conditional(content_versions)
+def search_page():
+    q = request.args.get("q", "").strip()
+    page = max(request.args.get("page", 1, type=int), 1)
+    templates, has_next = [], False
+    if q:
+        ids = search.search_template_ids(db.session, q, SEARCH_PAGE_SIZE + 1, (page - 1) * SEARCH_PAGE_SIZE)
+        has_next = len(ids) > SEARCH_PAGE_SIZE
+        ids = ids[:SEARCH_PAGE_SIZE]
+        found = {t.id: t for t in Template.query.filter(Template.id.in_(ids))}
+        templates = [found[i] for i in ids if i in found]
+    return render_template("search.html", q=q, templates=templates, page=page, has_next=has_next)
+
+
+@route("/thumb/<kind>/<int:obj_id>/<size>.<fmt>")
+def thumbnail(kind, obj_id, size, fmt):
+    if size not in render.SIZES or fmt not in render.FORMATS:
+        abort(404)
+    if kind == "template":
+        obj = Template.query.get_or_404(obj_id)
+    elif kind == "card":
+        obj = Card.query.get_or_404(obj_id)
+        if obj.user_id != session.get("user_id"):
+            abort(404)
     else:
-        templates_sorted = sorted(templates, key=lambda t: (t.dynamic_rating, t.dynamic_likes), reverse=True)
-        title = "Trending templates"
+        abort(404)
+
+    path = render.cached_render(obj, current_app.config["THUMBNAIL_DIR"], size, fmt, image_loader=load_background)
+    # Versioned URLs never change content, so let browsers keep them for good
+    versioned = request.args.get("v") == render.style_hash(render.card_style(obj))
+    response = send_file(path, mimetype=render.FORMATS[fmt], conditional=True, max_age=THUMBNAIL_MAX_AGE if versioned else None)
+    if versioned:
+        response.cache_control.immutable = True
+    if kind == "card":
+        response.cache_control.public = False
+        response.cache_control.private = True
+    return response
+
+
+@route("/upload/background", methods=["POST"])
+@login_required
+def upload_background():
+    file = request.files.get("image")
+    if not file or not file.filename:
+        return jsonify(error="No file uploaded."), 400
+    digest = store_blob(file.read())
+    if not digest:
+        return jsonify(error="Unsupported image."), 400
+    db.session.commit()
+    return jsonify(hash=digest, url=url_for("blob", digest=digest))
+
+
+@route("/blob/<digest>")
+def blob(digest):
+    record = db.session.get(Blob, digest) if is_blob_ref(digest) else None
+    if record is None or not blobs.exists(digest):
+        abort(404)
+    # Content-addressed: the bytes behind a hash never change
+    response = send_file(blobs.path(digest), mimetype=record.mime_type, conditional=True, max_age=THUMBNAIL_MAX_AGE)
+    response.cache_control.immutable = True
+    return response
 
-    return render_template("discover.html", templates=templates_sorted[:24], mode=mode, title=title)
 
+@route("/metrics")
+def prometheus_metrics():
+    token = current_app.config["METRICS_TOKEN"]
+    if token and not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        abort(404)
+    body = metrics.render(current_app.config["METRICS_DIR"])
+    return current_app.response_class(body, mimetype="text/plain; version=0.0.4")
 
-@app.route("/about")
+
+@route("/about")
 def about():
     return render_template("about.html")
 
 
-@app.route("/register", methods=["GET", "POST"])
+@route("/register", methods=["GET", "POST"])
 def register():
     if request.method == "POST":
         username = request.form.get("username", "").strip()
@@ -592,13 +1647,14 @@ def register():
         db.session.add(user)
         db.session.commit()
         session["user_id"] = user.id
+        remember_identity(user)
         flash("Account created and logged in!", "success")
         next_url = request.args.get("next") or url_for("index")
         return redirect(next_url)
     return render_template("auth_register.html")
 
 
-@app.route("/login", methods=["GET", "POST"])
+@route("/login", methods=["GET", "POST"])
 def login():
     if request.method == "POST":
         username_or_email = request.form.get("username_or_email", "").strip()
@@ -610,20 +1666,21 @@ def login():
             flash("Invalid credentials.", "error")
             return redirect(url_for("login"))
         session["user_id"] = user.id
+        remember_identity(user)
         flash("Logged in successfully.", "success")
         next_url = request.args.get("next") or url_for("index")
         return redirect(next_url)
     return render_template("auth_login.html")
 
 
-@app.route("/logout")
+@route("/logout")
 def logout():
     session.pop("user_id", None)
     flash("Logged out.", "info")
     return redirect(url_for("index"))
 
 
-@app.route("/editor/<int:template_id>")
+@route("/editor/<int:template_id>")
 @login_required
 def editor(template_id):
     tpl = Template.query.get_or_404(template_id)
@@ -632,7 +1689,57 @@ def editor(template_id):
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-@app.route("/edit-profile", methods=["GET", "POST"])
+
+def avatar_dir():
+    return os.path.join(current_app.static_folder, current_app.config['UPLOAD_FOLDER'])
+
+
+def pending_upload_path(key):
+    return os.path.join(current_app.config["PENDING_UPLOAD_DIR"], f"{key}.upload")
+
+
+def delete_profile_pic(profile_pic):
+    """Queue removal of a picture's files; call before the commit that drops the reference."""
+    if profile_pic:
+        jobs.enqueue(db.session, "remove_avatar", profile_pic=profile_pic)
+
+
+@jobs.task("process_avatar")
+def process_avatar_task(key):
+    path = pending_upload_path(key)
+    try:
+        with open(path, "rb") as fh:
+            data = fh.read()
+    except FileNotFoundError:
+        return  # an earlier attempt finished
+    avatars.process(data, avatar_dir(), key)
+    os.remove(path)
+
+
+@jobs.task("remove_avatar")
+def remove_avatar_task(profile_pic):
+    if avatars.is_avatar_key(profile_pic):
+        avatars.remove(avatar_dir(), profile_pic)
+        return
+    # Pictures uploaded before the avatar pipeline are a single original file
+    filepath = os.path.join(avatar_dir(), secure_filename(profile_pic))
+    if os.path.exists(filepath):
+        os.remove(filepath)
+
+
+def avatar_url(user, size=128, fmt="webp"):
+    """URL of a user's avatar at ``size`` px, or None while it is still being processed."""
+    if not user or not user.profile_pic:
+        return None
+    if not avatars.is_avatar_key(user.profile_pic):
+        return url_for('static', filename=f"{current_app.config['UPLOAD_FOLDER']}/{user.profile_pic}")
+    name = avatars.filename(user.profile_pic, size, fmt)
+    if not os.path.exists(os.path.join(avatar_dir(), name)):
+        return None
+    return url_for('static', filename=f"{current_app.config['UPLOAD_FOLDER']}/{name}")
+
+
+@route("/edit-profile", methods=["GET", "POST"])
 @login_required
 def edit_profile():
     user = current_user()
@@ -640,12 +1747,10 @@ def edit_profile():
 
         # REMOVE PROFILE  PIC (from same form)
         if request.form.get("remove_pic"):
-            if user.profile_pic:
-                filepath = os.path.join(app.static_folder or 'static', app.config['UPLOAD_FOLDER'], user.profile_pic)
-                if os.path.exists(filepath):
-                    os.remove(filepath)
+            delete_profile_pic(user.profile_pic)
             user.profile_pic = None
             db.session.commit()
+            remember_identity(user)
             flash("Profile picture removed.", "success")
             return redirect(url_for("edit_profile"))
         
@@ -690,22 +1795,25 @@ def edit_profile():
                     flash("Invalid file type. Allowed types: png, jpg, jpeg, gif, webp.", "error")
                     return render_template("edit_profile.html", user=user)
                 
-            # UPLOAD
+            # UPLOAD: validate here, resize/re-encode in the background worker
             if file and file.filename and allowed_file(file.filename):
-                
-                # DELETE OLD IMAGE
-                if user.profile_pic:
-                    old_filepath = os.path.join(app.static_folder or 'static', app.config['UPLOAD_FOLDER'], user.profile_pic)
-                    if os.path.exists(old_filepath):
-                        os.remove(old_filepath)
-                         
-                filename = secure_filename(f"{uuid.uuid4()}_{file.filename}")
-                filepath = os.path.join(app.static_folder or 'static', app.config['UPLOAD_FOLDER'], filename)
-                
-                file.save(filepath)
-                user.profile_pic = filename
+                data = file.read()
+                try:
+                    avatars.check_image(data)
+                except avatars.AvatarError as e:
+                    flash(f"{e} Please choose another picture.", "error")
+                    return render_template("edit_profile.html", user=user)
+
+                key = uuid.uuid4().hex
+                os.makedirs(current_app.config["PENDING_UPLOAD_DIR"], exist_ok=True)
+                with open(pending_upload_path(key), "wb") as fh:
+                    fh.write(data)
+                jobs.enqueue(db.session, "process_avatar", key=key)
+                delete_profile_pic(user.profile_pic)
+                user.profile_pic = key
             
             db.session.commit()
+            remember_identity(user)
             flash("Profile updated successfully!", "success")
             return redirect(url_for("profile"))
             
@@ -717,18 +1825,15 @@ def edit_profile():
     return render_template("edit_profile.html", user=user)
 
 
-@app.route("/remove-profile-pic", methods=["POST"])
+@route("/remove-profile-pic", methods=["POST"])
 @login_required
 def remove_profile_pic():
     user = current_user()
     try:
-        # Delete existing file if exists
-        if user.profile_pic:
-            filepath = os.path.join(app.static_folder or 'static', app.config['UPLOAD_FOLDER'], user.profile_pic)
-            if os.path.exists(filepath):
-                os.remove(filepath)
+        delete_profile_pic(user.profile_pic)
         user.profile_pic = None
         db.session.commit()
+        remember_identity(user)
         flash("Profile picture removed successfully.", "success")
     except Exception:
         flash("Error removing picture.", "error")
@@ -736,32 +1841,30 @@ def remove_profile_pic():
     return redirect(url_for("edit_profile"))
 
 
-@app.route("/edit-card/<int:card_id>")
+@route("/edit-card/<int:card_id>")
 @login_required
 def edit_card(card_id):
-    user = current_user()
     card = Card.query.get_or_404(card_id)
-    if card.user_id != user.id:
+    if card.user_id != session["user_id"]:
         flash("You don't have permission to edit this card.", "error")
         return redirect(url_for("profile"))
-    template = db.session.get(Template, card.template_id)
-    return render_template("editor.html", template=template, card=card)
+    return render_template("editor.html", template=card.template, card=card)
 
 
-@app.route("/delete-card/<int:card_id>", methods=["POST"])
+@route("/delete-card/<int:card_id>", methods=["POST"])
 @login_required
 def delete_card(card_id):
-    user = current_user()
     card = Card.query.get_or_404(card_id)
-    if card.user_id != user.id:
+    if card.user_id != session["user_id"]:
         flash("You don't have permission to delete this card.", "error")
         return redirect(url_for("profile"))
+    release_blob(card.bg_image)
     db.session.delete(card)
     db.session.commit()
     flash("Card deleted successfully.", "success")
     return redirect(url_for("profile"))
 
-@app.route("/save-card/<int:template_id>", methods=["GET", "POST"])
+@route("/save-card/<int:template_id>", methods=["GET", "POST"])
 @login_required
 def save_card(template_id):
     tpl = Template.query.get_or_404(template_id)
@@ -794,7 +1897,7 @@ def save_card(template_id):
     line2_color = request.form.get("line2_color", "#cccccc")
     text_bold = request.form.get("text_bold", "0")
     text_italic = request.form.get("text_italic", "0")
-    bg_image = request.form.get("bg_image", "")
+    bg_image = card_background(request.form.get("bg_image", ""))
     
     # Get text positions
     label_top = request.form.get("label_top", 70)
@@ -845,7 +1948,11 @@ def save_card(template_id):
         existing_card.line2_color = line2_color
         existing_card.text_bold = 1 if text_bold == "1" else 0
         existing_card.text_italic = 1 if text_italic == "1" else 0
-        existing_card.bg_image = bg_image if bg_image else None
+        if existing_card.bg_image != bg_image:
+            release_blob(existing_card.bg_image)
+            retain_blob(bg_image)
+        existing_card.bg_image = bg_image
+        jobs.enqueue(db.session, "render_thumbnails", kind="card", obj_id=existing_card.id)
         db.session.commit()
         flash("Card updated successfully!", "success")
     else:
@@ -868,16 +1975,132 @@ def save_card(template_id):
             line2_color=line2_color,
             text_bold=1 if text_bold == "1" else 0,
             text_italic=1 if text_italic == "1" else 0,
-            bg_image=bg_image if bg_image else None,
+            bg_image=bg_image,
         )
+        retain_blob(bg_image)
         db.session.add(card)
+        db.session.flush()
+        jobs.enqueue(db.session, "render_thumbnails", kind="card", obj_id=card.id)
         db.session.commit()
         flash("Card saved to your profile.", "success")
     
     return redirect(url_for("profile"))
 
 
-@app.route("/review/<int:template_id>", methods=["POST"])
+def card_etag(card):
+    return f"card-{card.id}-v{card.version}"
+
+
+def card_json(card, status=200):
+    data = {field: getattr(card, field) for field in cardschema.FIELDS}
+    data.update(id=card.id, version=card.version, thumb_url=thumb_url(card, "sm"))
+    response = jsonify(data)
+    response.status_code = status
+    response.set_etag(card_etag(card))
+    return response
+
+
+def owned_card(card_id):
+    return Card.query.filter_by(id=card_id, user_id=session["user_id"]).first_or_404()
+
+
+@route("/api/cards/<int:card_id>")
+@login_required
+def api_card(card_id):
+    return card_json(owned_card(card_id))
+
+
+@route("/api/cards/<int:card_id>", methods=["PATCH"])
+@login_required
+def api_update_card(card_id):
+    """Apply the posted fields only, if the client's If-Match still names the current version."""
+    card = owned_card(card_id)
+    if not request.if_match:
+        return jsonify(error="Send If-Match with the card's ETag."), 428
+    if not request.if_match.contains(card_etag(card)):
+        return card_json(card, 412)
+    try:
+        changes = cardschema.validate_patch(request.get_json(silent=True))
+    except cardschema.CardSchemaError as exc:
+        return jsonify(error=str(exc), fields=exc.fields), 400
+    if changes.get("bg_image") and db.session.get(Blob, changes["bg_image"]) is None:
+        return jsonify(error="bg_image must be an uploaded image hash.", fields=["bg_image"]), 400
+
+    changes = {field: value for field, value in changes.items() if getattr(card, field) != value}
+    if not changes:
+        return card_json(card)
+    if "bg_image" in changes:
+        release_blob(card.bg_image)
+        retain_blob(changes["bg_image"])
+    for field, value in changes.items():
+        setattr(card, field, value)
+    try:
+        db.session.commit()
+    except StaleDataError:
+        # Another save landed between our read and our UPDATE
+        db.session.rollback()
+        return card_json(owned_card(card_id), 412)
+    return card_json(card)
+
+
+@route("/export/card/<int:card_id>", methods=["POST"])
+@login_required
+def export_card(card_id):
+    card = Card.query.filter_by(id=card_id, user_id=session["user_id"]).first_or_404()
+    payload = request.get_json(silent=True) or {}
+    style = render.card_style(card)
+    try:
+        job_id = exports.start(
+            current_app.config["EXPORT_DIR"],
+            session["user_id"],
+            style,
+            load_background(style["bg_image"]) if style["bg_image"] else None,
+            payload.get("guests"),
+            payload.get("format", "zip"),
+            payload.get("size", "md"),
+        )
+    except exports.ExportError as exc:
+        return jsonify(error=str(exc)), 400
+    jobs.enqueue(db.session, "export_card", max_attempts=exports.MAX_ATTEMPTS, job_id=job_id)
+    db.session.commit()
+    return jsonify(job=job_id, status_url=url_for("export_status", job_id=job_id)), 202
+
+
+@jobs.task("export_card")
+def export_card_task(job_id):
+    exports.run(current_app.config["EXPORT_DIR"], job_id, workers=current_app.config["EXPORT_WORKERS"])
+
+
+def owned_export(job_id):
+    status = exports.read_status(current_app.config["EXPORT_DIR"], job_id)
+    if status is None or status["owner"] != session["user_id"]:
+        abort(404)
+    return status
+
+
+@route("/export/<job_id>")
+@login_required
+def export_status(job_id):
+    status = owned_export(job_id)
+    download_url = url_for("export_download", job_id=job_id) if status["state"] == "done" else None
+    return jsonify(
+        state=status["state"], done=status["done"], total=status["total"],
+        error=status["error"], download_url=download_url,
+    )
+
+
+@route("/export/<job_id>/download")
+@login_required
+def export_download(job_id):
+    status = owned_export(job_id)
+    if status["state"] != "done":
+        abort(404)
+    fmt = status["format"]
+    path = exports.output_path(os.path.join(current_app.config["EXPORT_DIR"], job_id), fmt)
+    return send_file(path, mimetype=exports.FORMATS[fmt], as_attachment=True, download_name=f"cardhub-invites.{fmt}")
+
+
+@route("/review/<int:template_id>", methods=["POST"])
 def add_review(template_id):
     tpl = Template.query.get_or_404(template_id)
     try:
@@ -887,11 +2110,11 @@ def add_review(template_id):
     rating = max(1, min(5, rating))
     comment = request.form.get("comment", "").strip()
     display_name = None
-    user = current_user()
+    user = current_identity()
     user_id = None
     if user:
-        display_name = user.username
-        user_id = user.id
+        display_name = user["username"]
+        user_id = user["id"]
     else:
         anon_name = request.form.get("name", "").strip()
         display_name = anon_name or random.choice(REVIEW_NAMES)
@@ -908,32 +2131,101 @@ def add_review(template_id):
         display_name=display_name,
     )
     db.session.add(review)
+    tpl.record_review(rating)
     db.session.commit()
-
-    reviews = Review.query.filter_by(template_id=template_id).all()
-    tpl.review_count = len(reviews)
-    tpl.rating = round(sum(r.rating for r in reviews) / len(reviews), 1)
-    db.session.commit()
+    invalidate_home()
 
     flash("Review added. Thank you for your feedback!", "success")
     return redirect(url_for("template_detail", template_id=template_id))
 
 
-@app.route("/profile", methods=["GET", "POST"])
+PROFILE_PAGE_SIZE = 24
+# The user, then one page query and one count each for cards and reviews, however many there are
+PROFILE_STATEMENT_BUDGET = 5
+
+
+# Many-to-one joins: one query per page instead of one per card/review
+def profile_cards(user_id):
+    return (
+        Card.query.options(joinedload(Card.template))
+        .filter_by(user_id=user_id)
+        .order_by(Card.created_at.desc(), Card.id.desc())
+    )
+
+
+def profile_reviews(user_id):
+    return (
+        Review.query.options(joinedload(Review.template))
+        .filter_by(user_id=user_id)
+        .order_by(Review.created_at.desc(), Review.id.desc())
+    )
+
+
+@route("/profile", methods=["GET", "POST"])
 @login_required
 def profile():
     user = current_user()
 
-    cards = Card.query.filter_by(user_id=user.id).order_by(Card.created_at.desc()).all()
+    cards = profile_cards(user.id).paginate(
+        page=request.args.get("cards_page", 1, type=int), per_page=PROFILE_PAGE_SIZE, error_out=False,
+    )
+    user_reviews = profile_reviews(user.id).paginate(
+        page=request.args.get("reviews_page", 1, type=int), per_page=PROFILE_PAGE_SIZE, error_out=False,
+    )
 
-    for card in cards:
-        if card.template_id:
-            card.template = db.session.get(Template, card.template_id)
+    return render_template("profile.html", user=user, cards=cards, reviews=user_reviews)
 
-    user_reviews = Review.query.filter_by(user_id=user.id).order_by(Review.created_at.desc()).all()
 
-    return render_template("profile.html", user=user, cards=cards, reviews=user_reviews)
+def create_app(test_config=None):
+    app = Flask(__name__)
+    app.config.from_mapping(config.load_config())
+    if test_config:
+        app.config.from_mapping(test_config)
+    instance_dirs = {
+        "CACHE_DIR": "cache", "THUMBNAIL_DIR": "thumbnails", "BLOB_DIR": "blobs", "EXPORT_DIR": "exports",
+        "PENDING_UPLOAD_DIR": "pending", "METRICS_DIR": "metrics", "FRAGMENT_CACHE_DIR": "fragments",
+        "JINJA_CACHE_DIR": "jinja",
+    }
+    for key, folder in instance_dirs.items():
+        if not app.config[key]:
+            app.config[key] = os.path.join(app.instance_path, folder)
+    os.makedirs(os.path.join(app.static_folder, app.config['UPLOAD_FOLDER']), exist_ok=True)
+    app.config["BUILD_TOKEN"] = build_token(app)
+
+    db.init_app(app)
+    app.extensions["cardhub_cache"] = make_cache(app.config)
+    app.extensions["cardhub_cache"].on_lookup = record_cache_lookup
+    app.extensions["cardhub_fragments"] = make_cache(app.config, "FRAGMENT_CACHE")
+    app.extensions["cardhub_fragments"].on_lookup = record_cache_lookup
+    app.extensions["cardhub_blobs"] = BlobStore(app.config['BLOB_DIR'])
+    app.extensions["cardhub_review_streams"] = threading.BoundedSemaphore(app.config["REVIEW_STREAM_LIMIT"])
+
+    os.makedirs(app.config["JINJA_CACHE_DIR"], exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config["JINJA_CACHE_DIR"])
+    app.jinja_env.filters['datetimefilter'] = datetimefilter
+    app.jinja_env.filters['ago'] = ago
+    app.jinja_env.globals['bg_image_url'] = bg_image_url
+    app.jinja_env.globals['thumb_url'] = thumb_url
+    app.jinja_env.globals['avatar_url'] = avatar_url
+    app.jinja_env.globals['card_etag'] = card_etag
+    app.jinja_env.globals['tile'] = tile
+    app.context_processor(inject_globals)
+    app.url_defaults(static_url_defaults)
+    app.view_functions["static"] = static_file
+    metrics.configure(app.config["METRICS_DIR"])
+    app.before_request(start_request_metrics)
+    app.after_request(record_request_metrics)
+    before_render_template.connect(_template_started, app)
+    template_rendered.connect(_template_finished, app)
+    for rule, view, options in routes:
+        app.add_url_rule(rule, view_func=view, **options)
+    app.cli.add_command(cli)
+
+    with app.app_context():
+        install_sqlite_pragmas()
+        install_sql_metrics()
+    return app
 
 
 if __name__ == "__main__":
-    app.run(debug=True)
+    create_app().run(debug=True)
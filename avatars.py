@@ -0,0 +1,85 @@
+"""Profile picture processing.
+
+Uploads are decoded once, orientation-corrected, stripped of EXIF and other
+metadata, centre-cropped to a square and re-encoded at a few fixed sizes.
+The work runs as a background job (see jobs.py) so the request that uploaded
+the picture does not wait for it.
+"""
+import io
+import os
+import re
+import tempfile
+
+from PIL import Image, ImageOps
+
+SIZES = (48, 128, 512)
+FORMATS = ("webp", "jpg")
+MAX_PIXELS = 40_000_000  # refuse to decode anything bigger than ~40 MP
+KEY_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+class AvatarError(ValueError):
+    pass
+
+
+def is_avatar_key(value):
+    return bool(value) and bool(KEY_RE.match(value))
+
+
+def filename(key, size, fmt="webp"):
+    return f"{key}-{size}.{fmt}"
+
+
+def check_image(data):
+    """Cheap header-only validation, done on the request thread before queueing."""
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            width, height = image.size
+            image.verify()
+    except Exception as exc:
+        raise AvatarError("Not a valid image.") from exc
+    if width * height > MAX_PIXELS:
+        raise AvatarError("Image is too large.")
+
+
+def _save(image, path, fmt):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, "wb") as fh:
+        if fmt == "webp":
+            image.save(fh, "WEBP", quality=82, method=4)
+        else:
+            image.save(fh, "JPEG", quality=85, optimize=True, progressive=True)
+    os.replace(tmp, path)
+
+
+def process(data, out_dir, key):
+    """Write every size/format variant of the avatar ``key`` into ``out_dir``."""
+    with Image.open(io.BytesIO(data)) as image:
+        # JPEG can decode at a reduced scale directly, which is much cheaper
+        image.draft("RGB", (max(SIZES) * 2, max(SIZES) * 2))
+        image = ImageOps.exif_transpose(image)
+        if image.mode in ("RGBA", "LA", "P"):
+            image = image.convert("RGBA")
+            flattened = Image.new("RGB", image.size, (255, 255, 255))
+            flattened.paste(image, mask=image.getchannel("A"))
+            image = flattened
+        else:
+            image = image.convert("RGB")
+
+        # Building new images from pixels drops EXIF/ICC/comment metadata
+        square = ImageOps.fit(image, (max(SIZES), max(SIZES)), Image.LANCZOS)
+
+    os.makedirs(out_dir, exist_ok=True)
+    for size in SIZES:
+        resized = square if size == square.width else square.resize((size, size), Image.LANCZOS)
+        for fmt in FORMATS:
+            _save(resized, os.path.join(out_dir, filename(key, size, fmt)), fmt)
+
+
+def remove(out_dir, key):
+    for size in SIZES:
+        for fmt in FORMATS:
+            try:
+                os.remove(os.path.join(out_dir, filename(key, size, fmt)))
+            except FileNotFoundError:
+                pass
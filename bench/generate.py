@@ -0,0 +1,158 @@
+"""Build a synthetic CardHub database of any size for benchmarks.
+
+The schema comes from the app's own migrations; rows are written with Core
+executemany inserts in large batches, so millions of rows take minutes, not
+hours. The same ``--seed`` always produces the same data. Every user's
+password is ``password`` (hashed once and shared) so load tests can log in
+as ``user<N>``.
+
+    python bench/generate.py /tmp/cardhub-bench.db --users 10000 --templates 20000 \\
+        --cards 50000 --reviews 200000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from werkzeug.security import generate_password_hash
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as cardhub  # noqa: E402
+import migrations  # noqa: E402
+
+PASSWORD = "password"
+BATCH_SIZE = 10000
+
+CATEGORIES = [
+    "Birthday", "Wedding", "Baby Shower", "Corporate", "Anniversary", "Graduation",
+    "Housewarming", "Engagement", "Festival", "Farewell", "Retirement", "Kids Party",
+]
+THEMES = [
+    "Floral", "Minimal", "Vintage", "Royal", "Pastel", "Golden", "Rustic", "Modern",
+    "Tropical", "Boho", "Classic", "Neon", "Watercolor", "Elegant", "Playful", "Starry",
+]
+WORDS = [
+    "celebrate", "join", "evening", "dinner", "party", "love", "family", "friends", "garden",
+    "sunset", "music", "laughter", "cake", "dance", "memories", "together", "cheers", "welcome",
+]
+COLORS = ["#1e293b", "#f8fafc", "#fde68a", "#fbcfe8", "#bbf7d0", "#bfdbfe", "#ddd6fe", "#111111"]
+FONTS = ["", "'Great Vibes', cursive", "'Playfair Display', serif", "'Poppins', sans-serif"]
+
+
+def skewed(rng, n):
+    # Low ids are far more popular, roughly like real traffic
+    return int(n * rng.random() ** 2) + 1
+
+
+def sentence(rng, words=5):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def user_rows(count, password_hash, now):
+    for i in range(1, count + 1):
+        yield {
+            "id": i, "username": f"user{i}", "email": f"user{i}@example.test",
+            "password_hash": password_hash, "created_at": now - timedelta(days=i % 700),
+        }
+
+
+def template_rows(rng, count):
+    for i in range(1, count + 1):
+        category = CATEGORIES[i % len(CATEGORIES)]
+        theme = rng.choice(THEMES)
+        yield {
+            "id": i, "name": f"{theme} {category} #{i}", "category": category, "thumbnail": "",
+            "bg_color": rng.choice(COLORS), "label_text": category,
+            "title_text": f"{theme} {category}", "line1_text": sentence(rng), "line2_text": sentence(rng, 4),
+            "likes": rng.randint(0, 500),
+        }
+
+
+def card_rows(rng, count, users, templates, now):
+    for i in range(1, count + 1):
+        yield {
+            "id": i, "user_id": skewed(rng, users), "template_id": skewed(rng, templates),
+            "title_text": sentence(rng, 3), "line1_text": sentence(rng), "line2_text": sentence(rng, 4),
+            "label_text": rng.choice(CATEGORIES), "bg_color": rng.choice(COLORS),
+            "font_family": rng.choice(FONTS), "title_size": rng.randint(32, 64), "body_size": rng.randint(14, 22),
+            "created_at": now - timedelta(seconds=rng.randint(0, 365 * 86400)), "version": 1,
+        }
+
+
+def review_rows(rng, count, users, templates, now):
+    for i in range(1, count + 1):
+        # One in five reviews is anonymous, as on the site
+        user_id = skewed(rng, users) if users and rng.random() > 0.2 else None
+        yield {
+            "id": i, "user_id": user_id, "template_id": skewed(rng, templates),
+            "rating": rng.choices((1, 2, 3, 4, 5), weights=(1, 1, 3, 8, 12))[0],
+            "comment": f"{rng.choice(cardhub.REVIEW_SNIPPETS)} {sentence(rng, 3)}.",
+            "display_name": f"user{user_id}" if user_id else rng.choice(cardhub.REVIEW_NAMES),
+            "created_at": now - timedelta(seconds=count - i),
+        }
+
+
+def insert_all(conn, table, rows, label):
+    started, total, batch = time.perf_counter(), 0, []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            conn.execute(table.insert(), batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        conn.execute(table.insert(), batch)
+        total += len(batch)
+    print(f"{label:<10} {total:>10} rows {time.perf_counter() - started:>8.1f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", help="SQLite file to create")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--templates", type=int, default=2000)
+    parser.add_argument("--cards", type=int, default=5000)
+    parser.add_argument("--reviews", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--force", action="store_true", help="Replace an existing file.")
+    args = parser.parse_args()
+    if args.templates < 1:
+        parser.error("--templates must be at least 1")
+    if args.cards and not args.users:
+        parser.error("--cards needs at least one user")
+
+    path = os.path.abspath(args.path)
+    if os.path.exists(path):
+        if not args.force:
+            sys.exit(f"{path} exists; pass --force to replace it")
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    # Read by create_app(); nothing touches the database at import time
+    os.environ["CARDHUB_DATABASE_URI"] = f"sqlite:///{path}"
+    application = cardhub.create_app()
+    rng = random.Random(args.seed)
+    now = datetime(2026, 1, 1)
+    with application.app_context():
+        engine = cardhub.db.engine
+        migrations.upgrade(engine, cardhub.db.metadata)
+        tables = cardhub.db.metadata.tables
+        with engine.begin() as conn:
+            insert_all(conn, tables["users"], user_rows(args.users, generate_password_hash(PASSWORD), now), "users")
+            insert_all(conn, tables["templates"], template_rows(rng, args.templates), "templates")
+            insert_all(conn, tables["cards"], card_rows(rng, args.cards, args.users, args.templates, now), "cards")
+            insert_all(conn, tables["reviews"], review_rows(rng, args.reviews, args.users, args.templates, now), "reviews")
+
+        started = time.perf_counter()
+        cardhub.backfill_template_stats()
+        print(f"{'stats':<10} {args.templates:>10} rows {time.perf_counter() - started:>8.1f} s")
+        with engine.begin() as conn:
+            conn.exec_driver_sql("ANALYZE")
+    print(f"Wrote {path} ({os.path.getsize(path) / 1e6:.0f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+"""Mixed read/write load test with p50/p95/p99 per route and a stored baseline.
+
+Starts gunicorn on a private copy of a database built by bench/generate.py,
+so every run begins from the same data. Then N clients, each logged in as
+a random ``user<N>``, replay a fixed mix of page views and writes for a set
+time. The results are compared with bench/baseline.json. A route whose p95
+latency, or an overall throughput, is worse than the baseline by more than
+``--tolerance`` fails the run, as do request errors above the baseline's
+rate and baseline routes that no longer succeed at all.
+
+    python bench/generate.py /tmp/cardhub-bench.db
+    python bench/loadtest.py /tmp/cardhub-bench.db --clients 8 --seconds 20
+    python bench/loadtest.py /tmp/cardhub-bench.db --save-baseline
+
+Pass ``--url`` to drive a server that is already running instead; the
+database argument then only supplies the user and template counts.
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = os.path.join(ROOT, "bench", "baseline.json")
+PASSWORD = "password"
+
+# route -> (weight, request builder); about 80% reads, 20% writes
+MIX = {
+    "index": (15, lambda rng, ctx: ("GET", "/", None)),
+    "templates_gallery": (20, lambda rng, ctx: ("GET", "/templates", None)),
+    "discover": (10, lambda rng, ctx: (
+        "GET", "/discover?mode=" + rng.choice(["trending", "top-liked", "most-comments"]), None)),
+    "template_detail": (25, lambda rng, ctx: ("GET", f"/template/{ctx.template(rng)}", None)),
+    "profile": (10, lambda rng, ctx: ("GET", "/profile", None)),
+    "save_card": (10, lambda rng, ctx: ("POST", f"/save-card/{ctx.template(rng)}", {
+        "title": "Load test party", "line1": "Saturday at eight", "line2": "Bring friends",
+        "label": "Benchmark", "bg": "#fde68a", "title_size": "48", "body_size": "18",
+    })),
+    "add_review": (10, lambda rng, ctx: ("POST", f"/review/{ctx.template(rng)}", {
+        "rating": str(rng.randint(1, 5)), "comment": "Generated by the load test.",
+    })),
+}
+
+
+class Dataset:
+    def __init__(self, path):
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        self.users, self.templates = (
+            conn.execute("SELECT (SELECT max(id) FROM users), (SELECT max(id) FROM templates)").fetchone()
+        )
+        conn.close()
+        if not self.users or not self.templates:
+            sys.exit(f"{path} has no users or templates; build it with bench/generate.py")
+
+    def template(self, rng):
+        # Same skew as the generator: popular templates get most of the traffic
+        return int(self.templates * rng.random() ** 2) + 1
+
+
+class Client:
+    """One keep-alive connection with its own session cookie."""
+
+    def __init__(self, base_url):
+        parts = urllib.parse.urlsplit(base_url)
+        self.conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+        self.cookie = None
+
+    def request(self, method, path, form=None):
+        headers = {"Cookie": self.cookie} if self.cookie else {}
+        body = None
+        if form is not None:
+            body = urllib.parse.urlencode(form)
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        try:
+            self.conn.request(method, path, body, headers)
+            response = self.conn.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            self.conn.close()
+            return None, None
+        cookie = response.getheader("Set-Cookie")
+        if cookie:
+            self.cookie = cookie.split(";", 1)[0]
+        return response.status, response.getheader("Location")
+
+    def login(self, username):
+        status, location = self.request("POST", "/login", {"username_or_email": username, "password": PASSWORD})
+        return status == 302 and not (location or "").rstrip("/").endswith("/login")
+
+
+def run_client(base_url, ctx, seed, warmup_until, deadline, results, errors):
+    rng = random.Random(seed)
+    client = Client(base_url)
+    if not client.login(f"user{rng.randint(1, ctx.users)}"):
+        errors["login"] = errors.get("login", 0) + 1
+        return
+    names = list(MIX)
+    weights = [MIX[name][0] for name in names]
+    while True:
+        now = time.perf_counter()
+        if now >= deadline:
+            return
+        name = rng.choices(names, weights)[0]
+        method, path, form = MIX[name][1](rng, ctx)
+        started = time.perf_counter()
+        status, _ = client.request(method, path, form)
+        elapsed = time.perf_counter() - started
+        if started < warmup_until:
+            continue
+        if status is None or status >= 400:
+            errors[name] = errors.get(name, 0) + 1
+        else:
+            results[name].append(elapsed)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1)]
+
+
+def summarize(results, errors, seconds):
+    routes = {}
+    for name, values in results.items():
+        # A route that only failed is kept, with no percentiles, so compare() sees it
+        if values or errors.get(name):
+            routes[name] = {
+                "count": len(values), "errors": errors.get(name, 0),
+                **{f"p{p}": round(percentile(values, p) * 1000, 2) if values else None for p in (50, 95, 99)},
+            }
+    total = sum(len(values) for values in results.values())
+    return {"routes": routes, "requests": total, "throughput": round(total / seconds, 1)}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(database, workdir, workers):
+    db_copy = os.path.join(workdir, "cardhub.db")
+    shutil.copy(database, db_copy)
+    port = free_port()
+    env = dict(os.environ, CARDHUB_DATABASE_URI=f"sqlite:///{db_copy}")
+    # Deployment settings unless the caller exported others
+    env.setdefault("CARDHUB_DB_PROFILE", "production")
+    env.setdefault("CARDHUB_CACHE_BACKEND", "file")
+    for key, folder in (("CACHE_DIR", "cache"), ("THUMBNAIL_DIR", "thumbnails"), ("BLOB_DIR", "blobs"),
+                        ("EXPORT_DIR", "exports"), ("PENDING_UPLOAD_DIR", "pending"), ("METRICS_DIR", "metrics"),
+                        ("FRAGMENT_CACHE_DIR", "fragments"), ("JINJA_CACHE_DIR", "jinja")):
+        env[f"CARDHUB_{key}"] = os.path.join(workdir, folder)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-w", str(workers), "-b", f"127.0.0.1:{port}", "app:create_app()"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        if server.poll() is not None:
+            sys.exit("gunicorn exited during startup")
+        status, _ = Client(base_url).request("GET", "/about")
+        if status == 200:
+            return server, base_url
+        time.sleep(0.1)
+    server.terminate()
+    sys.exit("gunicorn did not start within 10 s")
+
+
+def error_rate(stats):
+    attempts = stats["count"] + stats.get("errors", 0)
+    return stats.get("errors", 0) / attempts if attempts else 0.0
+
+
+def ms(value):
+    return "-" if value is None else f"{value:.1f}"
+
+
+def compare(report, baseline, tolerance):
+    """Print the deltas against ``baseline`` and return the list of regressions.
+
+    Besides slower p95s and lower throughput, a baseline route with no
+    successful requests fails, and so does an error rate above the
+    baseline's, i.e. any error on a route that had none. Failed logins are
+    only printed; they show up as missing requests.
+    """
+    if baseline["config"] != report["config"]:
+        print(f"warning: baseline was recorded with {baseline['config']}")
+    failures = []
+    print(f"\n{'route':<18} {'p95 ms':>9} {'baseline':>9} {'change':>8} {'errors':>8}")
+    names = [*baseline["routes"], *(name for name in report["routes"] if name not in baseline["routes"])]
+    for name in names:
+        stats = report["routes"].get(name) or {"count": 0, "errors": 0, "p95": None}
+        before = baseline["routes"].get(name)
+        change, flags = None, []
+        if before and not stats["count"]:
+            flags.append("MISSING")
+            failures.append(f"{name} had no successful requests")
+        elif before:
+            change = stats["p95"] / before["p95"] - 1 if before["p95"] else 0.0
+            if change > tolerance:
+                flags.append("REGRESSED")
+                failures.append(f"{name} p95 {stats['p95']:.1f} ms vs {before['p95']:.1f} ms")
+        rate, before_rate = error_rate(stats), error_rate(before) if before else 0.0
+        if stats["errors"] and rate > before_rate:
+            flags.append("ERRORS")
+            failures.append(f"{name} {stats['errors']} errors ({rate:.1%} vs {before_rate:.1%})")
+        print(
+            f"{name:<18} {ms(stats['p95']):>9} {ms(before and before['p95']):>9} "
+            f"{'-' if change is None else f'{change:+.0%}':>8} {rate:>8.1%}{''.join('  ' + f for f in flags)}"
+        )
+    change = report["throughput"] / baseline["throughput"] - 1
+    flag = "  REGRESSED" if change < -tolerance else ""
+    print(f"{'throughput req/s':<18} {report['throughput']:>9.1f} {baseline['throughput']:>9.1f} {change:>+8.0%}{flag}")
+    if flag:
+        failures.append(f"throughput {report['throughput']} req/s vs {baseline['throughput']}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("database", help="SQLite file from bench/generate.py")
+    parser.add_argument("--url", help="Drive an already running server instead of starting gunicorn.")
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn workers to start")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--warmup", type=float, default=3, help="Seconds of traffic excluded from the results.")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown before failing (0.25 = 25%%).")
+    parser.add_argument("--save-baseline", action="store_true", help="Record this run as the new baseline.")
+    args = parser.parse_args()
+
+    ctx = Dataset(args.database)
+    with tempfile.TemporaryDirectory() as workdir:
+        server = None
+        base_url = args.url
+        if not base_url:
+            server, base_url = start_server(args.database, workdir, args.workers)
+        try:
+            results = {name: [] for name in MIX}
+            errors = {}
+            started = time.perf_counter()
+            warmup_until = started + args.warmup
+            deadline = warmup_until + args.seconds
+            threads = [
+                threading.Thread(target=run_client, args=(base_url, ctx, args.seed * 1000 + i, warmup_until, deadline, results, errors))
+                for i in range(args.clients)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            if server:
+                server.terminate()
+                server.wait()
+
+    report = summarize(results, errors, args.seconds)
+    report["config"] = {
+        "users": ctx.users, "templates": ctx.templates, "clients": args.clients,
+        "workers": None if args.url else args.workers,
+    }
+    print(f"{'route':<18} {'count':>7} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, stats in report["routes"].items():
+        print(f"{name:<18} {stats['count']:>7} {stats['errors']:>7} {ms(stats['p50']):>8} {ms(stats['p95']):>8} {ms(stats['p99']):>8}")
+    print(f"{report['requests']} requests in {args.seconds:.0f} s: {report['throughput']} req/s")
+    if errors:
+        print(f"errors: {errors}")
+
+    if args.save_baseline:
+        report["machine"] = f"{platform.machine()} {os.cpu_count()} CPUs, Python {platform.python_version()}"
+        with open(args.baseline, "w") as fh:
+            json.dump(report, fh, indent=2)
+            fh.write("\n")
+        print(f"Saved baseline to {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        print("No baseline yet; rerun with --save-baseline to record one.")
+        return
+    with open(args.baseline) as fh:
+        failures = compare(report, json.load(fh), args.tolerance)
+    if failures:
+        sys.exit("Regressions: " + "; ".join(failures))
+
+
+if __name__ == "__main__":
+    main()
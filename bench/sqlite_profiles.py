@@ -0,0 +1,143 @@
+"""Read throughput under concurrent writes, per SQLite tuning profile.
+
+Mimics several gunicorn workers sharing cardhub.db: reader processes run
+the kind of indexed listing query /discover issues while writer processes
+insert reviews and bump template stats in short transactions (add_review).
+For each profile in config.SQLITE_PROFILES it reports reads/s with no
+writers, reads/s with writers, and how many operations failed with
+"database is locked".
+
+    python bench/sqlite_profiles.py --readers 4 --writers 2 --seconds 5
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+
+SCHEMA = """
+CREATE TABLE templates (
+    id INTEGER PRIMARY KEY, name TEXT, category TEXT,
+    likes INTEGER, rating FLOAT, review_count INTEGER,
+    rating_sum INTEGER NOT NULL DEFAULT 0, rating_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX ix_templates_trending ON templates (rating, likes, id);
+CREATE TABLE reviews (
+    id INTEGER PRIMARY KEY, template_id INTEGER NOT NULL,
+    rating INTEGER NOT NULL, comment TEXT NOT NULL
+);
+"""
+
+
+def connect(path, profile):
+    pragmas = config.SQLITE_PROFILES[profile]
+    timeout = pragmas.get("busy_timeout", 5000) / 1000
+    conn = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+    config.apply_sqlite_pragmas(conn, pragmas)
+    return conn
+
+
+def setup(path, profile, templates):
+    conn = connect(path, profile)
+    conn.executescript(SCHEMA)
+    rng = random.Random(0)
+    conn.execute("BEGIN")
+    conn.executemany(
+        "INSERT INTO templates (name, category, likes, rating, review_count) VALUES (?, ?, ?, ?, ?)",
+        [(f"t{i}", f"c{i % 12}", rng.randint(35, 220), round(rng.uniform(4.2, 4.9), 1), rng.randint(4, 45))
+         for i in range(templates)],
+    )
+    conn.execute("COMMIT")
+    conn.close()
+
+
+def reader(path, profile, seconds, results):
+    conn = connect(path, profile)
+    done = errors = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        try:
+            conn.execute(
+                "SELECT id, name, likes, rating FROM templates ORDER BY rating DESC, likes DESC, id DESC LIMIT 25"
+            ).fetchall()
+            done += 1
+        except sqlite3.OperationalError:
+            errors += 1
+    results.put(("read", done, errors))
+
+
+def writer(path, profile, seconds, templates, results):
+    conn = connect(path, profile)
+    rng = random.Random(os.getpid())
+    done = errors = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        template_id, rating = rng.randint(1, templates), rng.randint(1, 5)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("INSERT INTO reviews (template_id, rating, comment) VALUES (?, ?, 'bench')", (template_id, rating))
+            conn.execute(
+                "UPDATE templates SET rating_count = rating_count + 1, rating_sum = rating_sum + ?,"
+                " review_count = rating_count + 1 WHERE id = ?",
+                (rating, template_id),
+            )
+            conn.execute("COMMIT")
+            done += 1
+        except sqlite3.OperationalError:
+            errors += 1
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+    results.put(("write", done, errors))
+
+
+def run_phase(path, profile, readers, writers, seconds, templates):
+    results = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=reader, args=(path, profile, seconds, results)) for _ in range(readers)]
+    procs += [
+        multiprocessing.Process(target=writer, args=(path, profile, seconds, templates, results))
+        for _ in range(writers)
+    ]
+    for proc in procs:
+        proc.start()
+    totals = {"read": [0, 0], "write": [0, 0]}
+    for _ in procs:
+        kind, done, errors = results.get()
+        totals[kind][0] += done
+        totals[kind][1] += errors
+    for proc in procs:
+        proc.join()
+    return {kind: (done / seconds, errors) for kind, (done, errors) in totals.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--templates", type=int, default=10_000)
+    parser.add_argument("--profile", action="append", choices=sorted(config.SQLITE_PROFILES))
+    args = parser.parse_args()
+
+    print(f"{'profile':<12} {'reads/s idle':>14} {'reads/s +writes':>16} {'writes/s':>10} {'locked':>8}")
+    for profile in args.profile or sorted(config.SQLITE_PROFILES):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "bench.db")
+            setup(path, profile, args.templates)
+            idle = run_phase(path, profile, args.readers, 0, args.seconds, args.templates)
+            busy = run_phase(path, profile, args.readers, args.writers, args.seconds, args.templates)
+        locked = idle["read"][1] + busy["read"][1] + busy["write"][1]
+        print(
+            f"{profile:<12} {idle['read'][0]:>14.0f} {busy['read'][0]:>16.0f}"
+            f" {busy['write'][0]:>10.0f} {locked:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
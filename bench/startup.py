@@ -0,0 +1,72 @@
+"""Cold-start time of a CardHub worker.
+
+Each run is a fresh interpreter, the way a gunicorn worker boots: import
+app.py, call create_app() and serve one request. The database URI points
+at a directory that does not exist, so any query issued while importing or
+building the app fails the run instead of quietly slowing it down. Every
+``CARDHUB_*_DIR`` is a fresh temporary directory per run, so nothing is
+written to instance/ and no run reuses compiled templates.
+
+    python bench/startup.py --runs 10 --max-ms 800
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORKER = """
+import json, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+application = app.create_app()
+t2 = time.perf_counter()
+status = application.test_client().get("/about").status_code
+t3 = time.perf_counter()
+print(json.dumps({"import": t1 - t0, "create_app": t2 - t1, "first_request": t3 - t2, "status": status}))
+"""
+
+
+def run_once(env):
+    out = subprocess.run(
+        [sys.executable, "-c", WORKER], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--max-ms", type=float, help="Exit non-zero if the median cold start exceeds this.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, CARDHUB_DATABASE_URI=f"sqlite:///{os.path.join(tmp, 'missing', 'cardhub.db')}")
+        runs = []
+        for i in range(args.runs):
+            # Fresh directories per run, so no run starts from another's compiled templates
+            for key, folder in (("CACHE_DIR", "cache"), ("THUMBNAIL_DIR", "thumbnails"), ("BLOB_DIR", "blobs"),
+                                ("EXPORT_DIR", "exports"), ("PENDING_UPLOAD_DIR", "pending"), ("METRICS_DIR", "metrics"),
+                                ("FRAGMENT_CACHE_DIR", "fragments"), ("JINJA_CACHE_DIR", "jinja")):
+                env[f"CARDHUB_{key}"] = os.path.join(tmp, str(i), folder)
+            runs.append(run_once(env))
+
+    if any(r["status"] != 200 for r in runs):
+        sys.exit("GET /about failed; does startup depend on the database?")
+    print(f"{'phase':<14} {'median ms':>10} {'max ms':>8}")
+    for phase in ("import", "create_app", "first_request"):
+        values = [r[phase] * 1000 for r in runs]
+        print(f"{phase:<14} {statistics.median(values):>10.1f} {max(values):>8.1f}")
+    total = statistics.median((r["import"] + r["create_app"] + r["first_request"]) * 1000 for r in runs)
+    print(f"{'total':<14} {total:>10.1f}")
+    if args.max_ms and total > args.max_ms:
+        sys.exit(f"Cold start {total:.0f} ms exceeds --max-ms {args.max_ms:.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Content-addressed file store for uploaded images.
+
+Each blob is written once under ``<root>/<hash[:2]>/<hash>``, where the hash is
+the SHA-256 of its bytes, so identical uploads share a single file. Reference
+counts live in the database (``Blob`` in app.py); this module only deals
+with bytes on disk.
+"""
+import hashlib
+import os
+import re
+import tempfile
+
+HASH_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+def is_blob_ref(value):
+    return bool(value) and bool(HASH_RE.match(value))
+
+
+class BlobStore:
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, digest):
+        if not is_blob_ref(digest):
+            raise ValueError(f"Invalid blob reference {digest!r}")
+        return os.path.join(self.root, digest[:2], digest)
+
+    def put(self, data):
+        """Store ``data`` and return its hash; a no-op if the bytes are already stored."""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+        if os.path.exists(path):
+            return digest
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        return digest
+
+    def read(self, digest):
+        try:
+            with open(self.path(digest), "rb") as fh:
+                return fh.read()
+        except (OSError, ValueError):
+            return None
+
+    def exists(self, digest):
+        return is_blob_ref(digest) and os.path.exists(self.path(digest))
+
+    def delete(self, digest):
+        try:
+            os.remove(self.path(digest))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,180 @@
+"""Small pluggable cache used for page aggregates and rendered fragments.
+
+``MemoryCache`` is a per-process TTL/LRU cache. ``FileCache`` stores entries
+as pickles in a shared directory so every gunicorn worker on the host sees
+the same values and the same invalidations; nothing bounds that directory
+between requests, so the job worker calls ``sweep()`` on a timer.
+"""
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+STALE_TEMP_SECONDS = 3600  # a temp file this old was left behind by a crashed write
+
+
+class BaseCache:
+    # Optional ``on_lookup(key, hit)`` callback, e.g. for hit-ratio metrics
+    on_lookup = None
+
+    def get_or_set(self, key, factory, ttl=None):
+        value = self.get(key, _MISSING)
+        if self.on_lookup:
+            self.on_lookup(key, value is not _MISSING)
+        if value is _MISSING:
+            value = factory()
+            self.set(key, value, ttl)
+        return value
+
+    def sweep(self):
+        """Drop expired entries and return how many went; bounded caches have nothing to do."""
+        return 0
+
+
+class MemoryCache(BaseCache):
+    def __init__(self, maxsize=512, default_ttl=60):
+        self.maxsize = maxsize
+        self.default_ttl = default_ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expires, value = entry
+            if expires and expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        expires = time.monotonic() + ttl if ttl else 0
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class FileCache(BaseCache):
+    """Cache shared between processes through files in ``directory``.
+
+    Writes go through a temp file and ``os.replace`` so readers never see a
+    partial entry. Expiry uses wall-clock time since it crosses processes.
+    An expired entry is removed when it is read; ``sweep()`` removes the ones
+    nobody reads again and keeps at most ``maxsize`` of the newest entries.
+    """
+
+    def __init__(self, directory, default_ttl=60, maxsize=None):
+        self.directory = directory
+        self.default_ttl = default_ttl
+        self.maxsize = maxsize
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, digest + ".cache")
+
+    def _load(self, path):
+        with open(path, "rb") as fh:
+            return pickle.load(fh)
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def get(self, key, default=None):
+        path = self._path(key)
+        try:
+            expires, value = self._load(path)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return default
+        if expires and expires < time.time():
+            self._remove(path)
+            return default
+        return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        expires = time.time() + ttl if ttl else 0
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                pickle.dump((expires, value), fh, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._path(key))
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def delete(self, *keys):
+        for key in keys:
+            self._remove(self._path(key))
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(".cache"):
+                self._remove(os.path.join(self.directory, name))
+
+    def sweep(self):
+        """Remove expired entries and stale temp files, then the oldest entries above ``maxsize``."""
+        now = time.time()
+        removed = 0
+        live = []
+        for entry in os.scandir(self.directory):
+            try:
+                mtime = entry.stat().st_mtime
+                if entry.name.endswith(".tmp"):
+                    if mtime < now - STALE_TEMP_SECONDS:
+                        self._remove(entry.path)
+                        removed += 1
+                    continue
+                if not entry.name.endswith(".cache"):
+                    continue
+                expires, _ = self._load(entry.path)
+            except FileNotFoundError:
+                continue  # deleted or replaced under us
+            except (OSError, EOFError, pickle.UnpicklingError):
+                expires = now  # unreadable, so never a hit
+            if expires and expires <= now:
+                self._remove(entry.path)
+                removed += 1
+            else:
+                live.append((mtime, entry.path))
+        if self.maxsize and len(live) > self.maxsize:
+            live.sort()
+            for _, path in live[:len(live) - self.maxsize]:
+                self._remove(path)
+                removed += 1
+        return removed
+
+
+def make_cache(config, prefix="CACHE"):
+    """Build the cache selected by ``<prefix>_BACKEND`` (``memory`` or ``file``)."""
+    backend = config.get(f"{prefix}_BACKEND", "memory")
+    ttl = config.get(f"{prefix}_DEFAULT_TTL", 60)
+    maxsize = config.get(f"{prefix}_MAXSIZE", 512)
+    if backend == "file":
+        return FileCache(config[f"{prefix}_DIR"], default_ttl=ttl, maxsize=maxsize)
+    if backend == "memory":
+        return MemoryCache(maxsize=maxsize, default_ttl=ttl)
+    raise ValueError(f"Unknown {prefix}_BACKEND {backend!r}")
@@ -0,0 +1,109 @@
+"""Validation for card edits sent as JSON by the editor.
+
+``validate_patch`` checks a partial update against ``FIELDS`` and returns only
+the fields it contains, converted to their column types. Unknown fields and
+out-of-range values are rejected as a whole rather than silently dropped or
+clamped, so a client never believes it saved something it did not.
+"""
+import math
+import re
+
+from blobstore import is_blob_ref
+
+COLOR_RE = re.compile(r"^#(?:[0-9a-fA-F]{3}){1,2}$")
+
+
+class CardSchemaError(ValueError):
+    def __init__(self, message, fields=()):
+        super().__init__(message)
+        # The offending field names, so the editor can point at them
+        self.fields = list(fields)
+
+
+def text_field(max_length, nullable=False):
+    def validate(value):
+        if value is None and nullable:
+            return None
+        if not isinstance(value, str):
+            raise CardSchemaError("must be a string")
+        if len(value) > max_length:
+            raise CardSchemaError(f"must be at most {max_length} characters")
+        return value
+    return validate
+
+
+def int_field(low, high):
+    def validate(value):
+        # bool is an int subclass; reject it so true/false never turn into sizes
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise CardSchemaError("must be an integer")
+        # int() raises on inf and NaN, which json.loads accepts
+        if (isinstance(value, float) and not math.isfinite(value)) or value != int(value):
+            raise CardSchemaError("must be an integer")
+        if not low <= value <= high:
+            raise CardSchemaError(f"must be between {low} and {high}")
+        return int(value)
+    return validate
+
+
+def color_field(value):
+    if not isinstance(value, str) or not COLOR_RE.match(value):
+        raise CardSchemaError("must be a #rgb or #rrggbb colour")
+    return value.lower()
+
+
+def flag_field(value):
+    if value not in (True, False, 0, 1):
+        raise CardSchemaError("must be a boolean")
+    return int(value)
+
+
+def blob_field(value):
+    if value in (None, ""):
+        return None
+    if not is_blob_ref(value):
+        raise CardSchemaError("must be an uploaded image hash")
+    return value
+
+
+# Column limits match Card in app.py
+FIELDS = {
+    "label_text": text_field(80, nullable=True),
+    "title_text": text_field(200),
+    "line1_text": text_field(200),
+    "line2_text": text_field(200),
+    "bg_color": color_field,
+    "bg_image": blob_field,
+    "font_family": text_field(100, nullable=True),
+    "title_size": int_field(8, 200),
+    "title_color": color_field,
+    "body_size": int_field(6, 120),
+    "body_color": color_field,
+    "label_color": color_field,
+    "line1_color": color_field,
+    "line2_color": color_field,
+    "text_bold": flag_field,
+    "text_italic": flag_field,
+    "label_top": int_field(0, 2000),
+    "title_top": int_field(0, 2000),
+    "line1_top": int_field(0, 2000),
+    "line2_top": int_field(0, 2000),
+}
+
+
+def validate_patch(data):
+    """Cleaned ``{field: value}`` for a JSON patch; raises CardSchemaError listing every bad field."""
+    if not isinstance(data, dict):
+        raise CardSchemaError("Expected a JSON object of card fields.")
+    unknown = sorted(set(data) - set(FIELDS))
+    if unknown:
+        raise CardSchemaError(f"Unknown fields: {', '.join(unknown)}.", unknown)
+    cleaned, errors = {}, {}
+    for field, value in data.items():
+        try:
+            cleaned[field] = FIELDS[field](value)
+        except CardSchemaError as exc:
+            errors[field] = f"{field} {exc}"
+    if errors:
+        raise CardSchemaError("; ".join(errors.values()) + ".", errors)
+    return cleaned
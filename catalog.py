@@ -0,0 +1,129 @@
+"""Streaming readers for template catalogs.
+
+Each reader yields one plain dict per template, keyed by ``Template`` column
+names, while reading its source line by line, so a catalog of any size is
+parsed in constant memory. Supported sources:
+
+* ``.md``   -- the invitation_texts.md layout: ``## CATEGORY``, ``### Theme: ...``,
+  ``**Variation N:**`` and a fenced block of text lines per variation
+* ``.csv``  -- a header row of column names (``name``, ``category``, ``title_text``, ...)
+* ``.jsonl`` -- one JSON object per line with the same keys
+"""
+import csv
+import json
+import os
+import re
+
+FIELDS = {
+    "name": 120,
+    "category": 80,
+    "thumbnail": 200,
+    "bg_color": 20,
+    "bg_image": 200,
+    "title_text": 200,
+    "line1_text": 200,
+    "line2_text": 200,
+    "label_text": 200,
+}
+
+# Markdown section headings that differ from the category names used on the site
+CATEGORY_ALIASES = {"Corporate Event": "Corporate"}
+SKIP_SECTIONS = {"Quick Reference Guide"}
+
+CATEGORY_RE = re.compile(r"^##\s+(.+?)\s*$")
+THEME_RE = re.compile(r"^###\s+Theme:\s*(.+?)\s*$")
+VARIATION_RE = re.compile(r"^\*\*Variation\s+(\d+):?\*\*")
+
+
+class CatalogError(ValueError):
+    pass
+
+
+def clean(row):
+    """Keep known, non-empty fields, trimmed to their column length; None if unusable."""
+    out = {}
+    for key, limit in FIELDS.items():
+        value = row.get(key)
+        if value is None:
+            continue
+        value = str(value).strip()
+        if value:
+            out[key] = value[:limit]
+    if not out.get("name") or not out.get("category"):
+        return None
+    for key in ("title_text", "line1_text", "line2_text"):
+        out.setdefault(key, "")
+    return out
+
+
+def variation_row(category, theme, number, lines):
+    # Editor layout: small label, big title, then two body lines
+    return {
+        "name": f"{theme} {category} #{number}",
+        "category": category,
+        "label_text": lines[0] if lines else "",
+        "title_text": lines[1] if len(lines) > 1 else "",
+        "line1_text": " • ".join(lines[2:4]),
+        "line2_text": " • ".join(lines[4:6]),
+    }
+
+
+def read_markdown(fh):
+    category = theme = number = None
+    lines, in_block, collecting = [], False, False
+    for raw in fh:
+        line = raw.rstrip("\n")
+        if in_block:
+            if line.startswith("```"):
+                in_block = False
+                if category and theme and number:
+                    row = clean(variation_row(category, theme, number, lines))
+                    if row:
+                        yield row
+            elif collecting:
+                # Text up to the first blank line; the RSVP footer after it repeats contact info
+                if line.strip():
+                    lines.append(line.strip())
+                elif lines:
+                    collecting = False
+            continue
+        if line.startswith("```"):
+            lines, in_block, collecting = [], True, True
+        elif match := THEME_RE.match(line):
+            theme = match.group(1)
+        elif match := CATEGORY_RE.match(line):
+            category = match.group(1).title()
+            category = None if category in SKIP_SECTIONS else CATEGORY_ALIASES.get(category, category)
+            theme = None
+        elif match := VARIATION_RE.match(line):
+            number = int(match.group(1))
+
+
+def read_csv(fh):
+    for row in csv.DictReader(fh):
+        row = clean(row)
+        if row:
+            yield row
+
+
+def read_jsonl(fh):
+    for lineno, line in enumerate(fh, 1):
+        if not line.strip():
+            continue
+        try:
+            row = clean(json.loads(line))
+        except (json.JSONDecodeError, AttributeError) as exc:
+            raise CatalogError(f"line {lineno}: not a JSON object") from exc
+        if row:
+            yield row
+
+
+READERS = {"md": read_markdown, "csv": read_csv, "jsonl": read_jsonl}
+
+
+def read_catalog(path, fmt=None):
+    fmt = fmt or os.path.splitext(path)[1].lstrip(".").lower()
+    if fmt not in READERS:
+        raise CatalogError(f"Unsupported catalog format {fmt!r}")
+    with open(path, newline="" if fmt == "csv" else None, encoding="utf-8") as fh:
+        yield from READERS[fmt](fh)
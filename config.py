@@ -0,0 +1,112 @@
+"""Environment-driven settings for CardHub.
+
+``load_config()`` builds the Flask config for ``create_app()`` from
+``CARDHUB_*`` environment variables. Database tuning is grouped into named
+profiles picked with ``CARDHUB_DB_PROFILE``. ``default`` leaves SQLite as it
+ships, and ``production`` is meant for several gunicorn workers sharing one
+database file.
+"""
+import os
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+DEFAULT_DATABASE_URI = f"sqlite:///{os.path.join(BASE_DIR, 'cardhub.db')}"
+
+# PRAGMAs applied to every new SQLite connection, per profile
+SQLITE_PROFILES = {
+    "default": {},
+    "production": {
+        # Readers no longer block the writer (and vice versa)
+        "journal_mode": "WAL",
+        # Durable at checkpoints; far fewer fsyncs than FULL in WAL mode
+        "synchronous": "NORMAL",
+        # Wait for a lock instead of failing with "database is locked"
+        "busy_timeout": 5000,
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -64 * 1024,  # negative = KiB, i.e. 64 MiB per connection
+        "temp_store": "MEMORY",
+    },
+}
+
+# Pool sizing per profile; SQLite file databases use a QueuePool
+POOL_PROFILES = {
+    "default": {},
+    "production": {"pool_size": 8, "max_overflow": 4, "pool_timeout": 10},
+}
+
+
+def db_profile():
+    name = os.environ.get("CARDHUB_DB_PROFILE", "default")
+    if name not in SQLITE_PROFILES:
+        raise ValueError(f"Unknown CARDHUB_DB_PROFILE {name!r}")
+    return name
+
+
+def engine_options(profile, uri=DEFAULT_DATABASE_URI):
+    options = dict(POOL_PROFILES[profile])
+    for key in ("pool_size", "max_overflow"):
+        env = os.environ.get(f"CARDHUB_DB_{key.upper()}")
+        if env:
+            options[key] = int(env)
+    pragmas = SQLITE_PROFILES[profile]
+    if uri.startswith("sqlite") and "busy_timeout" in pragmas:
+        # sqlite3's own lock wait, in seconds, matching the PRAGMA
+        options["connect_args"] = {"timeout": pragmas["busy_timeout"] / 1000}
+    return options
+
+
+def load_config():
+    """Flask settings from the environment; paths left as None default to the instance folder."""
+    env = os.environ.get
+    profile = db_profile()
+    uri = env("CARDHUB_DATABASE_URI", DEFAULT_DATABASE_URI)
+    settings = {
+        "SECRET_KEY": env("CARDHUB_SECRET_KEY", "super-secret-cardhub-key"),
+        "SQLALCHEMY_DATABASE_URI": uri,
+        "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+        "SQLALCHEMY_ENGINE_OPTIONS": engine_options(profile, uri),
+        "SQLALCHEMY_BINDS": {},
+        "CARDHUB_DB_PROFILE": profile,
+        "MAX_CONTENT_LENGTH": 5 * 1024 * 1024,  # 5MB max file size
+        "UPLOAD_FOLDER": env("CARDHUB_UPLOAD_FOLDER", "uploads/profile_pics"),
+        "GALLERY_PAGE_SIZE": int(env("CARDHUB_GALLERY_PAGE_SIZE", 24)),
+        # Aggregate cache: "memory" per worker, or "file" to share across gunicorn workers
+        "CACHE_BACKEND": env("CARDHUB_CACHE_BACKEND", "memory"),
+        "CACHE_DIR": env("CARDHUB_CACHE_DIR"),
+        "CACHE_DEFAULT_TTL": int(env("CARDHUB_CACHE_TTL", 60)),
+        # Rendered template tiles; keys carry a content hash, so every stats change adds a new entry
+        "FRAGMENT_CACHE_BACKEND": env("CARDHUB_FRAGMENT_CACHE_BACKEND", "memory"),
+        "FRAGMENT_CACHE_DIR": env("CARDHUB_FRAGMENT_CACHE_DIR"),
+        "FRAGMENT_CACHE_DEFAULT_TTL": int(env("CARDHUB_FRAGMENT_CACHE_TTL", 3600)),
+        "FRAGMENT_CACHE_MAXSIZE": int(env("CARDHUB_FRAGMENT_CACHE_MAXSIZE", 4096)),
+        # How often `flask cardhub worker` drops expired and excess entries from file caches
+        "CACHE_SWEEP_INTERVAL": int(env("CARDHUB_CACHE_SWEEP_INTERVAL", 300)),
+        # Compiled Jinja templates shared by every worker
+        "JINJA_CACHE_DIR": env("CARDHUB_JINJA_CACHE_DIR"),
+        "THUMBNAIL_DIR": env("CARDHUB_THUMBNAIL_DIR"),
+        "BLOB_DIR": env("CARDHUB_BLOB_DIR"),
+        # Guest-list exports: directory shared by web and worker processes, and render processes per export job
+        "EXPORT_DIR": env("CARDHUB_EXPORT_DIR"),
+        "EXPORT_WORKERS": int(env("CARDHUB_EXPORT_WORKERS", 2)),
+        # Uploads waiting for the background worker; must be shared by web and worker processes
+        "PENDING_UPLOAD_DIR": env("CARDHUB_PENDING_UPLOAD_DIR"),
+        # Open /reviews/stream connections per worker process; keep it below gunicorn's threads
+        "REVIEW_STREAM_LIMIT": int(env("CARDHUB_REVIEW_STREAM_LIMIT", 4)),
+        # Per-worker metric files merged by /metrics; optional bearer token to scrape it
+        "METRICS_DIR": env("CARDHUB_METRICS_DIR"),
+        "METRICS_TOKEN": env("CARDHUB_METRICS_TOKEN"),
+    }
+
+    # Optional read replica, used by the read-only page routes
+    replica_uri = env("CARDHUB_REPLICA_URI")
+    if replica_uri:
+        settings["SQLALCHEMY_BINDS"]["replica"] = {"url": replica_uri, **engine_options(profile, replica_uri)}
+    return settings
+
+
+def apply_sqlite_pragmas(dbapi_connection, pragmas):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
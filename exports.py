@@ -0,0 +1,247 @@
+"""Batch export of one card for a whole guest list.
+
+Each guest gets a copy of the card with ``[Placeholder]`` text filled in from
+their entry, rendered by render.py in a process pool and packed into a ZIP of
+PNGs or a single multi-page PDF. ``start()`` only lays out the job directory;
+the web view then queues an ``export_card`` job and ``run()`` does the work in
+``flask cardhub worker``. Progress lives in a status file inside the job's
+directory, so whichever web worker answers a poll can report it.
+"""
+import io
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import time
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from PIL import Image
+
+import render
+
+FORMATS = {"zip": "application/zip", "pdf": "application/pdf"}
+TEXT_FIELDS = ("label_text", "title_text", "line1_text", "line2_text")
+MAX_GUESTS = 500
+MAX_VALUE_LENGTH = 200
+EXPORT_TTL = 24 * 3600
+MAX_ATTEMPTS = 3
+# A running export with no progress for this long has used up its job retries
+STALE_SECONDS = 1800
+JOB_RE = re.compile(r"^[0-9a-f]{32}$")
+PLACEHOLDER_RE = re.compile(r"\[([^\[\]]+)\]")
+
+
+class ExportError(ValueError):
+    pass
+
+
+def is_job_id(value):
+    return bool(value) and bool(JOB_RE.match(value))
+
+
+def validate_guests(guests):
+    if not isinstance(guests, list) or not guests:
+        raise ExportError("Provide a non-empty list of guests.")
+    if len(guests) > MAX_GUESTS:
+        raise ExportError(f"At most {MAX_GUESTS} guests per export.")
+    cleaned = []
+    for guest in guests:
+        if not isinstance(guest, dict):
+            raise ExportError("Each guest must be an object of placeholder values.")
+        cleaned.append({
+            str(key).strip().lower(): str(value)[:MAX_VALUE_LENGTH]
+            for key, value in guest.items()
+            if isinstance(value, (str, int, float))
+        })
+    return cleaned
+
+
+def guest_style(style, guest):
+    """``style`` with a guest's values: whole lines by field name, or ``[Key]`` placeholders."""
+    out = dict(style)
+    for field in TEXT_FIELDS:
+        if field in guest:
+            out[field] = guest[field]
+        else:
+            out[field] = PLACEHOLDER_RE.sub(
+                lambda m: guest.get(m.group(1).strip().lower(), m.group(0)), out[field] or ""
+            )
+    return out
+
+
+def _filename(index, guest):
+    name = re.sub(r"[^A-Za-z0-9]+", "-", guest.get("name", "")).strip("-")[:40] or "guest"
+    return f"{index:04d}-{name}.png"
+
+
+def render_variant(style, background_path, width, path):
+    # Runs in a pool process; the background is shared through a file rather than pickled per task
+    background = None
+    if background_path:
+        with open(background_path, "rb") as fh:
+            background = fh.read()
+    data = render.render_card(style, width, "png", image_loader=lambda _value: background)
+    # Written whole or not at all, so a rerun can keep every file it finds
+    with open(path + ".tmp", "wb") as fh:
+        fh.write(data)
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def _write_json(path, data):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, "w") as fh:
+        json.dump(data, fh)
+    os.replace(tmp, path)
+
+
+def output_path(job_dir, fmt):
+    return os.path.join(job_dir, f"export.{fmt}")
+
+
+def read_status(root, job_id):
+    if not is_job_id(job_id):
+        return None
+    try:
+        with open(os.path.join(root, job_id, "status.json")) as fh:
+            status = json.load(fh)
+    except (OSError, ValueError):
+        return None
+    if status["state"] == "running" and time.time() - status["updated"] > STALE_SECONDS:
+        status.update(state="failed", error="Export was interrupted.")
+    return status
+
+
+def purge_expired(root):
+    cutoff = time.time() - EXPORT_TTL
+    for entry in os.scandir(root):
+        if is_job_id(entry.name) and entry.stat().st_mtime < cutoff:
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def start(root, owner, style, background, guests, fmt="zip", size="md"):
+    """Validate an export and lay out its job directory; returns the job id to pass to ``run()``."""
+    if fmt not in FORMATS:
+        raise ExportError(f"Format must be one of {', '.join(FORMATS)}.")
+    if size not in render.SIZES:
+        raise ExportError(f"Size must be one of {', '.join(render.SIZES)}.")
+    guests = validate_guests(guests)
+
+    os.makedirs(root, exist_ok=True)
+    purge_expired(root)
+    job_id = uuid.uuid4().hex
+    job_dir = os.path.join(root, job_id)
+    os.makedirs(job_dir)
+    if background:
+        with open(os.path.join(job_dir, "background"), "wb") as fh:
+            fh.write(background)
+    _write_json(os.path.join(job_dir, "spec.json"), {
+        "width": render.SIZES[size],
+        "variants": [[guest_style(style, guest), _filename(i, guest)] for i, guest in enumerate(guests, 1)],
+    })
+    _write_json(os.path.join(job_dir, "status.json"), {
+        "owner": owner, "format": fmt, "state": "queued", "done": 0, "total": len(guests),
+        "error": None, "created": time.time(), "updated": time.time(),
+    })
+    return job_id
+
+
+def run(root, job_id, workers=None):
+    """Render a started export into its ZIP or PDF.
+
+    Safe to run again after a worker died: cards already on disk are kept.
+    A failed render is recorded in the status file rather than retried,
+    since the same input would fail the same way.
+    """
+    job_dir = os.path.join(root, job_id)
+    status_path = os.path.join(job_dir, "status.json")
+    status = read_status(root, job_id)
+    if status is None or status["state"] in ("done", "failed"):
+        return
+    fmt = status["format"]
+    try:
+        with open(os.path.join(job_dir, "spec.json")) as fh:
+            spec = json.load(fh)
+        background_path = os.path.join(job_dir, "background")
+        if not os.path.exists(background_path):
+            background_path = None
+        variants = [(style, os.path.join(job_dir, name)) for style, name in spec["variants"]]
+        todo = [(style, path) for style, path in variants if not os.path.exists(path)]
+        status.update(state="running", done=len(variants) - len(todo), updated=time.time())
+        _write_json(status_path, status)
+
+        if todo:
+            # spawn: the pool lives only as long as this job, so nothing is inherited from the worker
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+                futures = [pool.submit(render_variant, style, background_path, spec["width"], path) for style, path in todo]
+                for future in as_completed(futures):
+                    future.result()
+                    status.update(done=status["done"] + 1, updated=time.time())
+                    _write_json(status_path, status)
+
+        paths = [path for _, path in variants]
+        if fmt == "zip":
+            _write_zip(paths, output_path(job_dir, fmt))
+        else:
+            _write_pdf(paths, output_path(job_dir, fmt))
+        for path in paths:
+            os.remove(path)
+        status.update(state="done", updated=time.time())
+    except Exception as exc:
+        status.update(state="failed", error=str(exc) or exc.__class__.__name__, updated=time.time())
+    _write_json(status_path, status)
+
+
+def _write_zip(paths, out_path):
+    # PNGs are already compressed
+    with zipfile.ZipFile(out_path + ".tmp", "w", zipfile.ZIP_STORED) as zf:
+        for path in paths:
+            zf.write(path, os.path.basename(path))
+    os.replace(out_path + ".tmp", out_path)
+
+
+def _write_pdf(paths, out_path, dpi=96):
+    """One page per image, embedded as JPEG and written page by page to keep memory flat."""
+    count = len(paths)
+    offsets = []
+
+    with open(out_path + ".tmp", "wb") as fh:
+        def obj(number, body, stream=None):
+            offsets.append((number, fh.tell()))
+            fh.write(f"{number} 0 obj\n".encode() + body)
+            if stream is not None:
+                fh.write(b"\nstream\n" + stream + b"\nendstream")
+            fh.write(b"\nendobj\n")
+
+        fh.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        obj(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        kids = " ".join(f"{3 + 3 * i} 0 R" for i in range(count))
+        obj(2, f"<< /Type /Pages /Kids [{kids}] /Count {count} >>".encode())
+        for i, path in enumerate(paths):
+            page, content, image = 3 + 3 * i, 4 + 3 * i, 5 + 3 * i
+            with Image.open(path) as im:
+                width, height = im.size
+                jpeg = io.BytesIO()
+                im.convert("RGB").save(jpeg, "JPEG", quality=90)
+            w, h = width * 72 / dpi, height * 72 / dpi
+            obj(page, (
+                f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {w:.2f} {h:.2f}]"
+                f" /Resources << /XObject << /Im0 {image} 0 R >> >> /Contents {content} 0 R >>"
+            ).encode())
+            draw = f"q {w:.2f} 0 0 {h:.2f} 0 0 cm /Im0 Do Q".encode()
+            obj(content, f"<< /Length {len(draw)} >>".encode(), draw)
+            obj(image, (
+                f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height}"
+                f" /ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /DCTDecode /Length {jpeg.tell()} >>"
+            ).encode(), jpeg.getvalue())
+
+        xref = fh.tell()
+        fh.write(f"xref\n0 {len(offsets) + 1}\n0000000000 65535 f \n".encode())
+        for _, offset in sorted(offsets):
+            fh.write(f"{offset:010d} 00000 n \n".encode())
+        fh.write(f"trailer\n<< /Size {len(offsets) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+    os.replace(out_path + ".tmp", out_path)
@@ -0,0 +1,38 @@
+"""gunicorn settings for CardHub; gunicorn reads this file from the working directory.
+
+    gunicorn -w 4 "app:create_app()"
+
+Review pages keep a Server-Sent Events stream open (review_stream in app.py),
+so workers are threaded: a stream holds one thread instead of a whole
+process. ``-k gevent`` works too where gevent is installed. Flags on the
+command line override the values here.
+
+The hooks make only web workers export metrics (see metrics.py) and fold
+the files of exited workers into one.
+"""
+import os
+
+worker_class = "gthread"
+# Leave threads for page views beyond CARDHUB_REVIEW_STREAM_LIMIT open streams
+threads = int(os.environ.get("CARDHUB_WEB_THREADS", 8))
+
+# Same default as create_app(): <instance folder>/metrics
+METRICS_DIR = os.environ.get("CARDHUB_METRICS_DIR") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "instance", "metrics"
+)
+
+
+def on_starting(server):
+    import metrics
+    # Counters restart with the service; files from an earlier run would add to them
+    metrics.clear(METRICS_DIR)
+
+
+def post_fork(server, worker):
+    import metrics
+    metrics.enable()
+
+
+def child_exit(server, worker):
+    import metrics
+    metrics.retire(METRICS_DIR, worker.pid)
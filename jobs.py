@@ -0,0 +1,195 @@
+"""Background jobs backed by a table in the application database.
+
+``enqueue()`` inserts a row through the caller's session, so a job exists
+only if the request that created it commits. ``flask cardhub worker`` claims
+jobs one at a time with a single ``UPDATE ... RETURNING``: the claim sets a
+lease (``locked_until``) and a fresh ``lock_token``. If a worker dies
+mid-job the lease lapses and another worker picks the job up again. A job
+that raises is retried with exponential backoff until ``max_attempts``,
+then kept as ``failed`` with its error.
+
+Tasks must be safe to run more than once.
+"""
+import json
+import signal
+import time
+import traceback
+import uuid
+from collections import namedtuple
+
+from sqlalchemy import column, text
+
+DEFAULT_MAX_ATTEMPTS = 5
+VISIBILITY_TIMEOUT = 300
+POLL_INTERVAL = 1.0
+BACKOFF_BASE = 10
+BACKOFF_MAX = 3600
+MAX_ERROR_LENGTH = 2000
+
+Job = namedtuple("Job", "id kind payload attempts max_attempts lock_token")
+
+TASKS = {}
+
+ENQUEUE_SQL = text(
+    "INSERT INTO jobs (kind, payload, state, attempts, max_attempts, run_at, created_at, updated_at)"
+    " VALUES (:kind, :payload, 'queued', 0, :max_attempts, :run_at, :now, :now)"
+)
+
+CLAIM_SQL = text("""
+UPDATE jobs SET state = 'running', attempts = attempts + 1, locked_until = :until,
+    lock_token = :token, updated_at = :now
+WHERE id = (
+    SELECT id FROM jobs
+    WHERE (state = 'queued' AND run_at <= :now)
+       OR (state = 'running' AND locked_until < :now AND attempts < max_attempts)
+    ORDER BY run_at, id LIMIT 1
+)
+RETURNING id, kind, payload, attempts, max_attempts, lock_token
+""").columns(
+    column("id"), column("kind"), column("payload"), column("attempts"), column("max_attempts"), column("lock_token")
+)
+
+# Leases that lapsed on the final attempt: the worker died, so there is nobody left to record it
+REAP_SQL = text(
+    "UPDATE jobs SET state = 'failed', last_error = 'Lease expired on the final attempt.', updated_at = :now"
+    " WHERE state = 'running' AND locked_until < :now AND attempts >= max_attempts"
+)
+
+COMPLETE_SQL = text("DELETE FROM jobs WHERE id = :id AND lock_token = :token")
+
+RETRY_SQL = text(
+    "UPDATE jobs SET state = 'queued', run_at = :run_at, locked_until = NULL, lock_token = NULL,"
+    " last_error = :error, updated_at = :now WHERE id = :id AND lock_token = :token"
+)
+
+FAIL_SQL = text(
+    "UPDATE jobs SET state = 'failed', locked_until = NULL, lock_token = NULL,"
+    " last_error = :error, updated_at = :now WHERE id = :id AND lock_token = :token"
+)
+
+COUNTS_SQL = text("SELECT state, count(*) AS jobs FROM jobs GROUP BY state").columns(column("state"), column("jobs"))
+
+FAILED_SQL = text(
+    "SELECT id, kind, attempts, last_error FROM jobs WHERE state = 'failed' ORDER BY updated_at DESC LIMIT :limit"
+).columns(column("id"), column("kind"), column("attempts"), column("last_error"))
+
+REQUEUE_SQL = text(
+    "UPDATE jobs SET state = 'queued', attempts = 0, run_at = :now, last_error = NULL, updated_at = :now"
+    " WHERE state = 'failed'"
+)
+
+
+def task(name):
+    """Register ``fn`` as the handler for jobs of kind ``name``; it is called with the payload as keywords."""
+    def decorator(fn):
+        TASKS[name] = fn
+        return fn
+    return decorator
+
+
+def enqueue(session, kind, /, *, delay=0, max_attempts=DEFAULT_MAX_ATTEMPTS, **payload):
+    """Add a job in ``session``'s transaction; it becomes visible to workers on commit."""
+    if kind not in TASKS:
+        raise KeyError(f"Unknown job kind {kind!r}")
+    now = time.time()
+    session.execute(ENQUEUE_SQL, {
+        "kind": kind, "payload": json.dumps(payload), "max_attempts": max_attempts,
+        "run_at": now + delay, "now": now,
+    })
+
+
+def backoff(attempts):
+    return min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+
+
+def claim(engine, visibility_timeout=VISIBILITY_TIMEOUT):
+    """Lease the next due job, or return None when there is none."""
+    now = time.time()
+    with engine.begin() as conn:
+        conn.execute(REAP_SQL, {"now": now})
+        row = conn.execute(CLAIM_SQL, {"now": now, "until": now + visibility_timeout, "token": uuid.uuid4().hex}).first()
+    if row is None:
+        return None
+    return Job(row.id, row.kind, json.loads(row.payload), row.attempts, row.max_attempts, row.lock_token)
+
+
+def complete(engine, job):
+    with engine.begin() as conn:
+        conn.execute(COMPLETE_SQL, {"id": job.id, "token": job.lock_token})
+
+
+def fail(engine, job, error):
+    """Schedule a retry, or give up once the job has used all its attempts."""
+    now = time.time()
+    params = {"id": job.id, "token": job.lock_token, "error": error[-MAX_ERROR_LENGTH:], "now": now}
+    with engine.begin() as conn:
+        if job.attempts >= job.max_attempts:
+            conn.execute(FAIL_SQL, params)
+        else:
+            conn.execute(RETRY_SQL, {**params, "run_at": now + backoff(job.attempts)})
+
+
+def counts(engine):
+    with engine.connect() as conn:
+        return {row.state: row.jobs for row in conn.execute(COUNTS_SQL)}
+
+
+def failed(engine, limit=20):
+    with engine.connect() as conn:
+        return conn.execute(FAILED_SQL, {"limit": limit}).all()
+
+
+def requeue_failed(engine):
+    with engine.begin() as conn:
+        return conn.execute(REQUEUE_SQL, {"now": time.time()}).rowcount
+
+
+def work(engine, run, visibility_timeout=VISIBILITY_TIMEOUT, poll_interval=POLL_INTERVAL, burst=False, log=print,
+         periodic=()):
+    """Claim and ``run`` jobs until SIGTERM/SIGINT, or until the queue is empty with ``burst``.
+
+    ``run(job)`` executes one job; a job is deleted when it returns and retried when it raises.
+    ``periodic`` is a sequence of ``(interval, fn)`` housekeeping calls, each run between jobs
+    once at startup and then every ``interval`` seconds; an error is logged and tried again
+    on the next round. Returns the number of jobs that completed.
+    """
+    stopping = []
+
+    def stop(signum, frame):
+        # Finish the current job, then exit
+        stopping.append(signum)
+
+    previous = {sig: signal.signal(sig, stop) for sig in (signal.SIGTERM, signal.SIGINT)}
+    done = 0
+    next_run = [0.0] * len(periodic)
+    try:
+        while not stopping:
+            for i, (interval, fn) in enumerate(periodic):
+                if time.monotonic() >= next_run[i]:
+                    next_run[i] = time.monotonic() + interval
+                    try:
+                        fn()
+                    except Exception:
+                        log(f"periodic {getattr(fn, '__name__', fn)} failed:\n{traceback.format_exc()}")
+            job = claim(engine, visibility_timeout)
+            if job is None:
+                if burst:
+                    break
+                time.sleep(poll_interval)
+                continue
+            started = time.perf_counter()
+            try:
+                if job.kind not in TASKS:
+                    raise LookupError(f"No task registered for {job.kind!r}")
+                run(job)
+            except Exception:
+                fail(engine, job, traceback.format_exc())
+                log(f"job {job.id} {job.kind} failed (attempt {job.attempts}/{job.max_attempts})")
+                continue
+            complete(engine, job)
+            done += 1
+            log(f"job {job.id} {job.kind} done in {(time.perf_counter() - started) * 1000:.0f} ms")
+    finally:
+        for sig, handler in previous.items():
+            signal.signal(sig, handler)
+    return done
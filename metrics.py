@@ -0,0 +1,251 @@
+"""Prometheus metrics shared by every gunicorn worker.
+
+Only web workers record anything: gunicorn.conf.py calls ``enable()`` in
+each worker after the fork, so CLI commands, scripts and test clients that
+build the app leave no files behind. Each worker keeps counters and
+histograms in memory; a daemon thread writes them about once a second to
+``<directory>/<pid>-<token>.json``. ``render()`` merges every file in the
+directory, so whichever worker answers ``/metrics`` reports totals for all
+of them. When a worker exits, the master folds its file into
+``retired.json`` (``retire()``), so counters never go backwards while the
+service runs; ``clear()`` empties the directory when the master starts.
+"""
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+FLUSH_INTERVAL = 1.0
+
+# name -> (type, help, buckets)
+METRICS = {
+    "cardhub_requests_total": (
+        "counter", "Requests handled, by endpoint, method and status.", None),
+    "cardhub_request_duration_seconds": (
+        "histogram", "Time from request start to response, by endpoint.", LATENCY_BUCKETS),
+    "cardhub_request_sql_statements": (
+        "histogram", "SQL statements issued per request, by endpoint.", STATEMENT_BUCKETS),
+    "cardhub_sql_duration_seconds_total": (
+        "counter", "Time spent executing SQL statements, by endpoint.", None),
+    "cardhub_template_render_seconds": (
+        "histogram", "Jinja template render time, by template.", LATENCY_BUCKETS),
+    "cardhub_cache_requests_total": (
+        "counter", "Aggregate cache lookups, by key prefix and result.", None),
+}
+
+_lock = threading.Lock()
+_state = {"pid": None, "path": None, "counters": {}, "histograms": {}, "dirty": False}
+_directory = None
+_enabled = False
+RETIRED = "retired.json"
+
+
+def configure(directory):
+    global _directory
+    os.makedirs(directory, exist_ok=True)
+    _directory = directory
+
+
+def enable():
+    """Record and export metrics from this process; called in gunicorn workers only."""
+    global _enabled
+    _enabled = True
+
+
+def _labels(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _ensure_process():
+    # Called with _lock held; False outside web workers. A forked worker starts from zero.
+    if not _enabled:
+        return False
+    pid = os.getpid()
+    if _state["pid"] == pid:
+        return True
+    _state.update(pid=pid, counters={}, histograms={}, dirty=False)
+    _state["path"] = os.path.join(_directory, f"{pid}-{uuid.uuid4().hex[:8]}.json") if _directory else None
+    if _state["path"]:
+        threading.Thread(target=_flush_loop, args=(pid,), name="metrics-flush", daemon=True).start()
+        atexit.register(flush)
+    return True
+
+
+def inc(name, value=1, **labels):
+    key = (name, _labels(labels))
+    with _lock:
+        if not _ensure_process():
+            return
+        counters = _state["counters"]
+        counters[key] = counters.get(key, 0) + value
+        _state["dirty"] = True
+
+
+def observe(name, value, **labels):
+    buckets = METRICS[name][2]
+    key = (name, _labels(labels))
+    with _lock:
+        if not _ensure_process():
+            return
+        hist = _state["histograms"].get(key)
+        if hist is None:
+            # Per-bucket counts (the last one is +Inf), then sum and count
+            hist = _state["histograms"][key] = [0] * (len(buckets) + 1) + [0.0, 0]
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                hist[i] += 1
+                break
+        else:
+            hist[len(buckets)] += 1
+        hist[-2] += value
+        hist[-1] += 1
+        _state["dirty"] = True
+
+
+def _snapshot():
+    return {
+        "counters": [[name, labels, value] for (name, labels), value in _state["counters"].items()],
+        "histograms": [[name, labels, hist] for (name, labels), hist in _state["histograms"].items()],
+    }
+
+
+def flush():
+    """Write this process's numbers to its file if anything changed."""
+    with _lock:
+        if not _state["dirty"] or _state["pid"] != os.getpid() or not _state["path"]:
+            return
+        data = json.dumps(_snapshot())
+        path = _state["path"]
+        _state["dirty"] = False
+    _write(path, data)
+
+
+def _write(path, data):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, "w") as fh:
+        fh.write(data)
+    os.replace(tmp, path)
+
+
+def _flush_loop(pid):
+    while os.getpid() == pid:
+        time.sleep(FLUSH_INTERVAL)
+        try:
+            flush()
+        except OSError:
+            pass
+
+
+def _load(path):
+    try:
+        with open(path) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def _add(data, counters, histograms):
+    for name, labels, value in data["counters"]:
+        key = (name, tuple(map(tuple, labels)))
+        counters[key] = counters.get(key, 0) + value
+    for name, labels, hist in data["histograms"]:
+        key = (name, tuple(map(tuple, labels)))
+        if key in histograms:
+            histograms[key] = [a + b for a, b in zip(histograms[key], hist)]
+        else:
+            histograms[key] = list(hist)
+
+
+def collect(directory):
+    """Counters and histograms summed over every process file in ``directory``."""
+    counters, histograms = {}, {}
+    # Read first: a worker file it has already absorbed may not be deleted yet
+    retired = _load(os.path.join(directory, RETIRED)) or {"pids": [], "counters": [], "histograms": []}
+    _add(retired, counters, histograms)
+    absorbed = {str(pid) for pid in retired["pids"]}
+    for entry in os.scandir(directory):
+        if not entry.name.endswith(".json") or entry.name == RETIRED or entry.name.split("-", 1)[0] in absorbed:
+            continue
+        data = _load(entry.path)
+        if data:
+            _add(data, counters, histograms)
+    return counters, histograms
+
+
+def retire(directory, pid):
+    """Fold the files of exited worker ``pid`` into ``retired.json`` and delete them.
+
+    Called from the gunicorn master's ``child_exit`` hook, the only writer of
+    retired.json, so ``collect()`` stops summing one file per dead worker.
+    """
+    try:
+        paths = [entry.path for entry in os.scandir(directory) if entry.name.startswith(f"{pid}-")]
+    except FileNotFoundError:
+        return
+    if not paths:
+        return
+    counters, histograms = {}, {}
+    for path in [os.path.join(directory, RETIRED), *paths]:
+        data = _load(path)
+        if data:
+            _add(data, counters, histograms)
+    _write(os.path.join(directory, RETIRED), json.dumps({
+        "pids": [pid],
+        "counters": [[name, labels, value] for (name, labels), value in counters.items()],
+        "histograms": [[name, labels, hist] for (name, labels), hist in histograms.items()],
+    }))
+    for path in paths:
+        os.unlink(path)
+
+
+def clear(directory):
+    """Delete every metric file; the gunicorn master calls this at startup, when counters restart."""
+    os.makedirs(directory, exist_ok=True)
+    for entry in os.scandir(directory):
+        if entry.name.endswith(".json"):
+            os.unlink(entry.path)
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _series(name, labels, extra=()):
+    pairs = [*labels, *extra]
+    if not pairs:
+        return name
+    return name + "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(directory):
+    """The merged metrics in the Prometheus text exposition format."""
+    flush()
+    counters, histograms = collect(directory)
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == "counter":
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{_series(name, labels)} {_number(value)}")
+            continue
+        for (metric, labels), hist in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip((*buckets, "+Inf"), hist):
+                cumulative += count
+                lines.append(f"{_series(name + '_bucket', labels, [('le', str(bound))])} {cumulative}")
+            lines.append(f"{_series(name + '_sum', labels)} {_number(hist[-2])}")
+            lines.append(f"{_series(name + '_count', labels)} {hist[-1]}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,205 @@
+"""Versioned schema migrations.
+
+``create_all()`` only creates missing tables, so columns and indexes added to
+existing tables go through the numbered steps below. Applied versions are
+recorded in ``schema_migrations``; ``upgrade()`` runs whatever is pending, in
+order, each step in its own transaction. Steps only ever add (columns,
+indexes), so they are safe to run against a database of any age, including
+ones created before this table existed.
+
+To evolve the schema, declare the change on the model and append a step here.
+
+SQLite is the default and the only engine every step is written for.
+PostgreSQL gets its own DDL wherever SQLite syntax would not parse (the job
+table, the version triggers); full-text search is SQLite-only, so step 6 is
+skipped elsewhere and search.py falls back to substring matching.
+"""
+import time
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+
+MIGRATIONS = []
+
+
+def migration(version, name):
+    def decorator(fn):
+        MIGRATIONS.append((version, name, fn))
+        return fn
+    return decorator
+
+
+def add_column(conn, table, column, ddl):
+    """``ALTER TABLE ... ADD COLUMN`` unless the column is already there."""
+    if column not in {c["name"] for c in inspect(conn).get_columns(table)}:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+def is_sqlite(conn):
+    return conn.dialect.name == "sqlite"
+
+
+def create_index(conn, name, table, *columns):
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"))
+
+
+@migration(1, "initial tables")
+def initial_tables(conn, metadata):
+    # Fresh databases get every table in its current shape; later steps are then no-ops
+    metadata.create_all(conn)
+
+
+@migration(2, "template review aggregates")
+def template_review_aggregates(conn, metadata):
+    add_column(conn, "templates", "rating_sum", "INTEGER NOT NULL DEFAULT 0")
+    add_column(conn, "templates", "rating_count", "INTEGER NOT NULL DEFAULT 0")
+
+
+@migration(3, "template listing indexes")
+def template_listing_indexes(conn, metadata):
+    create_index(conn, "ix_templates_trending", "templates", "rating", "likes", "id")
+    create_index(conn, "ix_templates_likes", "templates", "likes", "id")
+    create_index(conn, "ix_templates_review_count", "templates", "review_count", "id")
+    create_index(conn, "ix_templates_category", "templates", "category", "id")
+
+
+@migration(4, "card and review indexes")
+def card_and_review_indexes(conn, metadata):
+    create_index(conn, "ix_cards_user_created", "cards", "user_id", "created_at", "id")
+    create_index(conn, "ix_reviews_template_created", "reviews", "template_id", "created_at")
+    create_index(conn, "ix_reviews_user_created", "reviews", "user_id", "created_at", "id")
+    create_index(conn, "ix_reviews_created", "reviews", "created_at")
+
+
+@migration(5, "unique template names")
+def unique_template_names(conn, metadata):
+    conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ux_templates_name ON templates (name)"))
+
+
+@migration(6, "full-text search")
+def full_text_search(conn, metadata):
+    if not is_sqlite(conn):
+        return  # FTS5 is SQLite's; search.py uses LIKE on other databases
+    # External-content FTS5 tables: the index only, rows are read from the base tables.
+    # Triggers keep them in sync with every writer, including Core bulk upserts.
+    columns = "name, title_text, line1_text, line2_text, category"
+    new = ", ".join(f"new.{c.strip()}" for c in columns.split(","))
+    old = ", ".join(f"old.{c.strip()}" for c in columns.split(","))
+    statements = [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS templates_fts USING fts5({columns},"
+        " content='templates', content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        "CREATE VIRTUAL TABLE IF NOT EXISTS templates_fts_vocab USING fts5vocab(templates_fts, row)",
+        f"CREATE TRIGGER IF NOT EXISTS templates_fts_ai AFTER INSERT ON templates BEGIN"
+        f" INSERT INTO templates_fts (rowid, {columns}) VALUES (new.id, {new}); END",
+        f"CREATE TRIGGER IF NOT EXISTS templates_fts_ad AFTER DELETE ON templates BEGIN"
+        f" INSERT INTO templates_fts (templates_fts, rowid, {columns}) VALUES ('delete', old.id, {old}); END",
+        # Only text edits touch the index, not the stats updates on every review
+        f"CREATE TRIGGER IF NOT EXISTS templates_fts_au AFTER UPDATE OF {columns} ON templates BEGIN"
+        f" INSERT INTO templates_fts (templates_fts, rowid, {columns}) VALUES ('delete', old.id, {old});"
+        f" INSERT INTO templates_fts (rowid, {columns}) VALUES (new.id, {new}); END",
+        "CREATE VIRTUAL TABLE IF NOT EXISTS reviews_fts USING fts5(comment,"
+        " content='reviews', content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        "CREATE TRIGGER IF NOT EXISTS reviews_fts_ai AFTER INSERT ON reviews BEGIN"
+        " INSERT INTO reviews_fts (rowid, comment) VALUES (new.id, new.comment); END",
+        "CREATE TRIGGER IF NOT EXISTS reviews_fts_ad AFTER DELETE ON reviews BEGIN"
+        " INSERT INTO reviews_fts (reviews_fts, rowid, comment) VALUES ('delete', old.id, old.comment); END",
+        "CREATE TRIGGER IF NOT EXISTS reviews_fts_au AFTER UPDATE OF comment ON reviews BEGIN"
+        " INSERT INTO reviews_fts (reviews_fts, rowid, comment) VALUES ('delete', old.id, old.comment);"
+        " INSERT INTO reviews_fts (rowid, comment) VALUES (new.id, new.comment); END",
+        "INSERT INTO templates_fts (templates_fts) VALUES ('rebuild')",
+        "INSERT INTO reviews_fts (reviews_fts) VALUES ('rebuild')",
+    ]
+    for statement in statements:
+        conn.execute(text(statement))
+
+
+@migration(7, "job queue")
+def job_queue(conn, metadata):
+    # Written only through jobs.py's SQL, so it has no model; times are Unix epoch seconds
+    if is_sqlite(conn):
+        id_column, seconds = "id INTEGER PRIMARY KEY AUTOINCREMENT", "REAL"
+    else:
+        id_column, seconds = "id BIGSERIAL PRIMARY KEY", "DOUBLE PRECISION"
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS jobs ("
+        f" {id_column}, kind VARCHAR(80) NOT NULL, payload TEXT NOT NULL,"
+        f" state VARCHAR(20) NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, max_attempts INTEGER NOT NULL,"
+        f" run_at {seconds} NOT NULL, locked_until {seconds}, lock_token VARCHAR(32), last_error TEXT,"
+        f" created_at {seconds} NOT NULL, updated_at {seconds} NOT NULL)"
+    ))
+    create_index(conn, "ix_jobs_state_run_at", "jobs", "state", "run_at", "id")
+
+
+@migration(8, "card versions")
+def card_versions(conn, metadata):
+    add_column(conn, "cards", "version", "INTEGER NOT NULL DEFAULT 1")
+
+
+@migration(9, "content versions")
+def content_versions(conn, metadata):
+    # One counter per table, bumped by every write: cheap validators for the listing pages' ETags.
+    # Seeded from the clock so a rebuilt database never reuses an old ETag.
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS content_versions (name VARCHAR(40) PRIMARY KEY, version BIGINT NOT NULL)"
+    ))
+    if conn.dialect.name not in ("sqlite", "postgresql"):
+        raise NotImplementedError(f"No content version triggers for {conn.dialect.name}")
+    if not is_sqlite(conn):
+        conn.execute(text(
+            "CREATE OR REPLACE FUNCTION bump_content_version() RETURNS trigger AS $$ BEGIN"
+            " UPDATE content_versions SET version = version + 1 WHERE name = TG_ARGV[0]; RETURN NULL;"
+            " END $$ LANGUAGE plpgsql"
+        ))
+    for table in ("templates", "reviews"):
+        conn.execute(text(
+            "INSERT INTO content_versions (name, version) SELECT :name, :version"
+            " WHERE NOT EXISTS (SELECT 1 FROM content_versions WHERE name = :name)"
+        ), {"name": table, "version": int(time.time()) * 1000})
+        if is_sqlite(conn):
+            for op in ("insert", "update", "delete"):
+                conn.execute(text(
+                    f"CREATE TRIGGER IF NOT EXISTS {table}_version_a{op[0]} AFTER {op.upper()} ON {table} BEGIN"
+                    f" UPDATE content_versions SET version = version + 1 WHERE name = '{table}'; END"
+                ))
+        else:
+            # One bump per statement is enough for a validator
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {table}_version ON {table}"))
+            conn.execute(text(
+                f"CREATE TRIGGER {table}_version AFTER INSERT OR UPDATE OR DELETE ON {table}"
+                f" FOR EACH STATEMENT EXECUTE FUNCTION bump_content_version('{table}')"
+            ))
+
+
+def ensure_version_table(conn):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        " version INTEGER PRIMARY KEY, name VARCHAR(200) NOT NULL, applied_at TIMESTAMP NOT NULL)"
+    ))
+
+
+def applied_versions(engine):
+    with engine.begin() as conn:
+        ensure_version_table(conn)
+        return {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+
+def pending(engine):
+    done = applied_versions(engine)
+    return [(version, name) for version, name, _ in sorted(MIGRATIONS) if version not in done]
+
+
+def upgrade(engine, metadata):
+    """Apply pending migrations and return the ``(version, name)`` pairs that ran."""
+    done = applied_versions(engine)
+    ran = []
+    for version, name, fn in sorted(MIGRATIONS):
+        if version in done:
+            continue
+        with engine.begin() as conn:
+            fn(conn, metadata)
+            conn.execute(
+                text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:v, :n, :at)"),
+                {"v": version, "n": name, "at": datetime.utcnow()},
+            )
+        ran.append((version, name))
+    return ran
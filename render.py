@@ -0,0 +1,221 @@
+"""Server-side card renderer.
+
+Turns the style fields of a ``Card`` or ``Template`` into a PNG/WebP image
+laid out like the editor preview (420x560 px, text centred at ``*_top``).
+Rendered files are cached on disk under a hash of the style, so a card is
+only drawn again when something that affects its pixels changes.
+
+Text is drawn in the system's DejaVu faces whatever the card's
+``font_family``: the editor's web fonts come from Google Fonts in the browser
+and are not shipped with the app, so thumbnails approximate the editor's
+typography rather than match it.
+"""
+import base64
+import binascii
+import hashlib
+import io
+import json
+import os
+import re
+import tempfile
+
+from PIL import Image, ImageColor, ImageDraw, ImageFont
+
+BASE_WIDTH = 420
+BASE_HEIGHT = 560
+
+# Output widths; height follows the 3:4 card ratio
+SIZES = {"sm": 240, "md": 480, "lg": 960}
+FORMATS = {"png": "image/png", "webp": "image/webp"}
+
+# Same defaults as the Card columns / editor preview
+DEFAULT_STYLE = {
+    "bg_color": "#ffffff",
+    "bg_image": None,
+    "label_text": "",
+    "title_text": "",
+    "line1_text": "",
+    "line2_text": "",
+    "font_family": "",
+    "title_size": 50,
+    "title_color": "#667eea",
+    "body_size": 18,
+    "body_color": "#cccccc",
+    "label_color": "#667eea",
+    "line1_color": "#cccccc",
+    "line2_color": "#cccccc",
+    "text_bold": 0,
+    "text_italic": 0,
+    "label_top": 70,
+    "title_top": 130,
+    "line1_top": 230,
+    "line2_top": 300,
+}
+
+# (bold, italic) -> DejaVu files in order of preference, from the fonts-dejavu package
+FONTS = {
+    (False, False): ("DejaVuSerif.ttf", "DejaVuSans.ttf"),
+    (True, False): ("DejaVuSerif-Bold.ttf", "DejaVuSans-Bold.ttf"),
+    (False, True): ("DejaVuSerif-Italic.ttf", "DejaVuSans-Oblique.ttf"),
+    (True, True): ("DejaVuSerif-BoldItalic.ttf", "DejaVuSans-BoldOblique.ttf"),
+}
+FONT_DIRS = [
+    "/usr/share/fonts/truetype/dejavu",  # Debian, Ubuntu
+    "/usr/share/fonts/dejavu",  # Fedora, Alpine
+]
+
+
+def card_style(obj):
+    """Extract the render-relevant fields from a Card or Template row."""
+    style = {key: getattr(obj, key, default) for key, default in DEFAULT_STYLE.items()}
+    for key, default in DEFAULT_STYLE.items():
+        if style[key] is None:
+            style[key] = default
+    if not style["label_text"] and getattr(obj, "category", None):
+        # Templates fall back to their category, as in the editor
+        style["label_text"] = obj.category
+    return style
+
+
+def style_hash(style):
+    payload = json.dumps(style, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()[:32]
+
+
+def _find_font_file(filename):
+    for directory in FONT_DIRS:
+        path = os.path.join(directory, filename)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def _load_font(size, bold=False, italic=False):
+    # The nearest installed face: the exact style, then upright, then regular
+    for key in dict.fromkeys([(bool(bold), bool(italic)), (bool(bold), False), (False, False)]):
+        for filename in FONTS[key]:
+            path = _find_font_file(filename)
+            if path:
+                return ImageFont.truetype(path, size)
+    return ImageFont.load_default(size=size)
+
+
+def _color(value, fallback):
+    try:
+        return ImageColor.getrgb(value)
+    except (ValueError, AttributeError):
+        return ImageColor.getrgb(fallback)
+
+
+def decode_data_url(value):
+    """Return raw bytes for a ``data:`` URL (optionally wrapped in ``url(...)``)."""
+    match = re.search(r"data:[^;,]*;base64,([A-Za-z0-9+/=\s]+)", value or "")
+    if not match:
+        return None
+    try:
+        return base64.b64decode(match.group(1))
+    except (binascii.Error, ValueError):
+        return None
+
+
+def _open_background(value, image_loader):
+    data = image_loader(value) if image_loader else decode_data_url(value)
+    if not data:
+        return None
+    try:
+        image = Image.open(io.BytesIO(data))
+        image.load()
+    except (OSError, Image.DecompressionBombError):
+        return None
+    return image.convert("RGB")
+
+
+def _cover(image, width, height):
+    scale = max(width / image.width, height / image.height)
+    resized = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))), Image.LANCZOS)
+    left = (resized.width - width) // 2
+    top = (resized.height - height) // 2
+    return resized.crop((left, top, left + width, top + height))
+
+
+def _wrap(draw, text, font, max_width):
+    lines, current = [], ""
+    for word in text.split():
+        candidate = f"{current} {word}".strip()
+        if current and draw.textlength(candidate, font=font) > max_width:
+            lines.append(current)
+            current = word
+        else:
+            current = candidate
+    if current:
+        lines.append(current)
+    return lines
+
+
+def render_card(style, width=BASE_WIDTH, fmt="png", image_loader=None):
+    """Render ``style`` (see :func:`card_style`) and return encoded image bytes."""
+    scale = width / BASE_WIDTH
+    height = round(BASE_HEIGHT * scale)
+
+    background = None
+    if style.get("bg_image"):
+        background = _open_background(style["bg_image"], image_loader)
+    if background is not None:
+        canvas = _cover(background, width, height).convert("RGBA")
+        overlay = Image.new("RGBA", canvas.size, (0, 0, 0, 128))
+        canvas = Image.alpha_composite(canvas, overlay)
+    else:
+        canvas = Image.new("RGBA", (width, height), _color(style["bg_color"], "#ffffff"))
+
+    draw = ImageDraw.Draw(canvas)
+    inset = round(20 * scale)
+    draw.rounded_rectangle(
+        (inset, inset, width - inset, height - inset),
+        radius=round(12 * scale), outline=(102, 126, 234, 77), width=max(1, round(scale)),
+    )
+
+    bold, italic = style["text_bold"], style["text_italic"]
+    layers = [
+        (style["label_text"].upper(), 10, style["label_color"], style["label_top"], False, False),
+        (style["title_text"], style["title_size"], style["title_color"], style["title_top"], bold, italic),
+        (style["line1_text"], style["body_size"], style["line1_color"], style["line1_top"], False, False),
+        (style["line2_text"], int(style["body_size"]) - 4, style["line2_color"], style["line2_top"], False, False),
+    ]
+    max_text_width = width * 0.85
+    for text, size, color, top, is_bold, is_italic in layers:
+        if not text:
+            continue
+        font = _load_font(max(1, round(int(size) * scale)), is_bold, is_italic)
+        y = int(top) * scale
+        for line in _wrap(draw, text, font, max_text_width):
+            draw.text((width / 2, y), line, font=font, fill=_color(color, "#333333"), anchor="ma")
+            y += font.size * 1.2
+
+    out = io.BytesIO()
+    if fmt == "webp":
+        canvas.convert("RGB").save(out, "WEBP", quality=85, method=4)
+    else:
+        canvas.convert("RGB").save(out, "PNG", optimize=True)
+    return out.getvalue()
+
+
+def thumbnail_path(cache_dir, digest, size, fmt):
+    return os.path.join(cache_dir, digest[:2], f"{digest}-{size}.{fmt}")
+
+
+def cached_render(obj, cache_dir, size="md", fmt="webp", image_loader=None):
+    """Return the path of the rendered thumbnail for ``obj``, rendering it on a cache miss."""
+    if size not in SIZES or fmt not in FORMATS:
+        raise ValueError(f"Unsupported thumbnail {size}.{fmt}")
+    style = card_style(obj)
+    path = thumbnail_path(cache_dir, style_hash(style), size, fmt)
+    if os.path.exists(path):
+        return path
+
+    data = render_card(style, SIZES[size], fmt, image_loader)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, "wb") as fh:
+        fh.write(data)
+    os.replace(tmp, path)
+    return path
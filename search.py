@@ -0,0 +1,128 @@
+"""Full-text search over templates and their reviews.
+
+Queries the FTS5 tables that migration 6 (migrations.py) creates and keeps in
+sync with triggers. Every word the user types is matched as a prefix, and a
+word that prefixes nothing in the template vocabulary is widened with its
+closest known spellings, so "brithday" still finds birthday invitations.
+
+FTS5 exists only in SQLite; on other databases migration 6 is skipped and
+``search_template_ids`` matches each word as a case-insensitive substring of
+the template's text fields instead, newest first, without reviews or ranking.
+
+Every match is ranked with bm25, which costs a few microseconds per row.
+Each table keeps only its ``offset + limit`` best templates before the two
+are merged, and that is enough for an exact page: a template in the top N
+overall is in the top N of whichever table gave it its best score.
+"""
+import difflib
+import re
+
+from sqlalchemy import and_, column, or_, select, table, text
+
+WORD_RE = re.compile(r"\w+")
+MAX_WORDS = 8
+MAX_CORRECTIONS = 3
+# A prefix covering more indexed terms than this is matched with FTS5's own prefix query
+MAX_PREFIX_TERMS = 16
+
+# bm25 column weights: name, title_text, line1_text, line2_text, category
+TEMPLATE_WEIGHTS = "10.0, 5.0, 1.0, 1.0, 3.0"
+# A hit in a review comment ranks below the same hit on the template itself
+REVIEW_WEIGHT = 0.5
+
+SEARCH_SQL = f"""
+-- MATERIALIZED keeps bm25 in a plain scan of each FTS table, where SQLite allows it
+WITH template_hits AS MATERIALIZED (
+    SELECT rowid AS template_id, bm25(templates_fts, {TEMPLATE_WEIGHTS}) AS score
+    FROM templates_fts WHERE templates_fts MATCH :match
+), review_hits AS MATERIALIZED (
+    SELECT rowid AS review_id, bm25(reviews_fts) * {REVIEW_WEIGHT} AS score
+    FROM reviews_fts WHERE reviews_fts MATCH :match
+)
+SELECT template_id, min(score) AS score FROM (
+    SELECT * FROM (SELECT template_id, score FROM template_hits ORDER BY score LIMIT :window)
+    UNION ALL
+    SELECT * FROM (
+        -- Best review per template, so many hits on one template can't crowd out the rest
+        SELECT reviews.template_id, min(review_hits.score) AS score
+        FROM review_hits JOIN reviews ON reviews.id = review_hits.review_id
+        GROUP BY reviews.template_id
+        ORDER BY score LIMIT :window
+    )
+)
+GROUP BY template_id
+ORDER BY score, template_id
+LIMIT :limit OFFSET :offset
+"""
+
+VOCAB_SQL = text(
+    "SELECT term FROM templates_fts_vocab WHERE term >= :low AND term < :high"
+    " AND length(term) BETWEEN :shortest AND :longest LIMIT :limit"
+).columns(column("term"))
+
+
+def words(query):
+    seen = []
+    for word in WORD_RE.findall((query or "").lower()):
+        if word not in seen:
+            seen.append(word)
+    return seen[:MAX_WORDS]
+
+
+def vocabulary(session, prefix, shortest=1, longest=1000, limit=-1):
+    # Every term starting with ``prefix`` sorts in [prefix, upper)
+    high = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    params = {"low": prefix, "high": high, "shortest": shortest, "longest": longest, "limit": limit}
+    return session.execute(VOCAB_SQL, params).scalars().all()
+
+
+def corrections(session, word):
+    """Indexed terms within a small edit distance of ``word``, sharing its first letter."""
+    candidates = vocabulary(session, word[0], len(word) - 2, len(word) + 2)
+    return difflib.get_close_matches(word, candidates, n=MAX_CORRECTIONS, cutoff=0.75)
+
+
+def word_expression(session, word):
+    completions = vocabulary(session, word, limit=MAX_PREFIX_TERMS + 1)
+    if len(completions) > MAX_PREFIX_TERMS:
+        return f'"{word}"*'
+    # Exact terms stream through FTS5; a long prefix query materializes every doclist first
+    options = completions or [word]
+    if not completions and len(word) >= 3:
+        options += corrections(session, word)
+    return " OR ".join(f'"{option}"' for option in options)
+
+
+def match_expression(session, query):
+    """FTS5 MATCH string for ``query``; empty when there is nothing to search for."""
+    return " AND ".join(f"({word_expression(session, word)})" for word in words(query))
+
+
+TEXT_COLUMNS = ("name", "title_text", "line1_text", "line2_text", "category")
+templates = table("templates", column("id"), *[column(name) for name in TEXT_COLUMNS])
+
+
+def substring_template_ids(session, query, limit, offset=0):
+    terms = words(query)
+    if not terms:
+        return []
+    stmt = (
+        select(templates.c.id)
+        .where(and_(*[or_(*[templates.c[name].ilike(f"%{term}%") for name in TEXT_COLUMNS]) for term in terms]))
+        .order_by(templates.c.id.desc())
+        .limit(limit)
+        .offset(offset)
+    )
+    return session.execute(stmt).scalars().all()
+
+
+def search_template_ids(session, query, limit, offset=0):
+    """Template ids for ``query``, best match first."""
+    if session.get_bind().dialect.name != "sqlite":
+        return substring_template_ids(session, query, limit, offset)
+    match = match_expression(session, query)
+    if not match:
+        return []
+    stmt = text(SEARCH_SQL).columns(column("template_id"), column("score"))
+    params = {"match": match, "window": offset + limit, "limit": limit, "offset": offset}
+    return [row.template_id for row in session.execute(stmt, params)]
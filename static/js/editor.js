@@ -219,9 +219,10 @@ function loadSavedStyles() {
         if (bgColorInput) bgColorInput.value = cardData.bg_color;
     }
     
-    // Load background image
+    // Load background image (stored as a blob hash, served from /blob/<hash>)
     if (cardData.bg_image && preview) {
-        preview.style.backgroundImage = cardData.bg_image;
+        preview.dataset.bgImage = cardData.bg_image;
+        preview.style.backgroundImage = `url(${cardData.bg_image_url})`;
         preview.style.backgroundSize = "cover";
         preview.style.backgroundPosition = "center";
     }
@@ -780,13 +781,28 @@ const bgImage = document.getElementById("bg-image");
 if (bgImage) {
     bgImage.addEventListener("change", function (e) {
         e.stopPropagation();
-        const reader = new FileReader();
-        reader.onload = function (event) {
-            preview.style.backgroundImage = `url(${event.target.result})`;
-            preview.style.backgroundSize = "cover";
-            preview.style.backgroundPosition = "center";
-        };
-        if (e.target.files[0]) reader.readAsDataURL(e.target.files[0]);
+        const file = e.target.files[0];
+        if (!file) return;
+
+        // Preview locally straight away, then upload the bytes once and
+        // keep only the returned hash in the form.
+        preview.style.backgroundImage = `url(${URL.createObjectURL(file)})`;
+        preview.style.backgroundSize = "cover";
+        preview.style.backgroundPosition = "center";
+
+        const body = new FormData();
+        body.append("image", file);
+        fetch(bgImage.dataset.uploadUrl, { method: "POST", body: body, credentials: "same-origin" })
+            .then(response => response.ok ? response.json() : Promise.reject(response))
+            .then(data => {
+                preview.dataset.bgImage = data.hash;
+                const bgImageInput = document.getElementById("bg-image-input");
+                if (bgImageInput) {
+                    bgImageInput.value = data.hash;
+                    bgImageInput.dispatchEvent(new Event("change", { bubbles: true }));
+                }
+            })
+            .catch(() => alert("Could not upload the background image."));
     });
 }
 
@@ -801,6 +817,7 @@ if (bgImageDelete) {
         preview.style.backgroundImage = "none";
         preview.style.backgroundColor = document.getElementById("bg-color")?.value || "#111111";
         document.getElementById("bg-image").value = "";
+        preview.dataset.bgImage = "";
     });
 }
 
@@ -901,6 +918,65 @@ window.downloadCard = function () {
     });
 };
 
+/* ================================================= */
+/* ================= GUEST LIST EXPORT ============= */
+/* ================================================= */
+
+const guestExport = document.getElementById("guest-export");
+if (guestExport) {
+    const exportBtn = document.getElementById("guest-export-btn");
+    const exportStatus = document.getElementById("guest-export-status");
+
+    function pollExport(statusUrl) {
+        fetch(statusUrl, { credentials: "same-origin" })
+            .then(response => response.json())
+            .then(job => {
+                if (job.state === "done") {
+                    exportStatus.innerHTML = `Done. <a href="${job.download_url}">Download ${job.total} invites</a>`;
+                    exportBtn.disabled = false;
+                } else if (job.state === "failed") {
+                    exportStatus.textContent = `Export failed: ${job.error}`;
+                    exportBtn.disabled = false;
+                } else if (job.state === "queued") {
+                    exportStatus.textContent = "Waiting for a free worker…";
+                    setTimeout(() => pollExport(statusUrl), 1000);
+                } else {
+                    exportStatus.textContent = `Rendering ${job.done} / ${job.total}…`;
+                    setTimeout(() => pollExport(statusUrl), 1000);
+                }
+            })
+            .catch(() => setTimeout(() => pollExport(statusUrl), 3000));
+    }
+
+    exportBtn.addEventListener("click", function (e) {
+        e.stopPropagation();
+        const guests = document.getElementById("guest-list").value
+            .split("\n")
+            .map(line => line.split(",").map(part => part.trim()))
+            .filter(parts => parts[0])
+            .map(([name, table, date]) => ({ name: name, table: table || "", date: date || "" }));
+        if (!guests.length) {
+            exportStatus.textContent = "Add at least one guest.";
+            return;
+        }
+
+        exportBtn.disabled = true;
+        exportStatus.textContent = "Starting export…";
+        fetch(guestExport.dataset.exportUrl, {
+            method: "POST",
+            credentials: "same-origin",
+            headers: { "Content-Type": "application/json" },
+            body: JSON.stringify({ guests: guests, format: document.getElementById("guest-export-format").value }),
+        })
+            .then(response => response.json().then(data => response.ok ? data : Promise.reject(data)))
+            .then(job => pollExport(job.status_url))
+            .catch(err => {
+                exportStatus.textContent = (err && err.error) || "Could not start the export.";
+                exportBtn.disabled = false;
+            });
+    });
+}
+
 /* ================================================= */
 /* ================= SYNC CONTROLS ON SELECT ====== */
 /* ================================================= */
@@ -1003,13 +1079,11 @@ function updateHiddenInputs() {
         textItalicInput.value = italicToggle.checked ? "1" : "0";
     }
     
-    // Background image
+    // Background image (blob hash from the upload endpoint)
     const bgImageInput = document.getElementById("bg-image-input");
     if (bgImageInput && preview) {
         const bgImage = preview.style.backgroundImage;
-        if (bgImage && bgImage !== "none") {
-            bgImageInput.value = bgImage;
-        }
+        bgImageInput.value = bgImage && bgImage !== "none" ? (preview.dataset.bgImage || "") : "";
     }
     
     // Background color
@@ -1051,6 +1125,159 @@ if (form) {
     });
 }
 
+/* ================================================= */
+/* ================= AUTOSAVE ====================== */
+/* ================================================= */
+
+// Saved cards send only the fields that changed, shortly after the last edit,
+// as a PATCH guarded by the card's ETag.
+const cardForm = document.querySelector("form[data-card-url]");
+if (cardForm) {
+    const AUTOSAVE_DELAY = 800;
+    const AUTOSAVE_FIELDS = {
+        label_text: "label-input",
+        title_text: "title-input",
+        line1_text: "line1-input",
+        line2_text: "line2-input",
+        bg_color: "bg-color-input",
+        bg_image: "bg-image-input",
+        font_family: "font-family-input",
+        title_size: "title-size-input",
+        title_color: "title-color-input",
+        body_size: "body-size-input",
+        body_color: "body-color-input",
+        label_color: "label-color-input",
+        line1_color: "line1-color-input",
+        line2_color: "line2-color-input",
+        text_bold: "text-bold-input",
+        text_italic: "text-italic-input",
+        label_top: "label-top-input",
+        title_top: "title-top-input",
+        line1_top: "line1-top-input",
+        line2_top: "line2-top-input",
+    };
+    const NUMERIC_FIELDS = ["title_size", "body_size", "text_bold", "text_italic", "label_top", "title_top", "line1_top", "line2_top"];
+    const autosaveStatus = document.getElementById("autosave-status");
+
+    let etag = cardForm.dataset.etag;
+    let saved = null;
+    // Values the server refused, per field; left out of later diffs until the field changes again
+    let rejected = {};
+    let timer = null;
+    let inFlight = false;
+    let rerun = false;
+    let stopped = false;
+
+    function currentFields() {
+        updateHiddenInputs();
+        const fields = {};
+        for (const [field, inputId] of Object.entries(AUTOSAVE_FIELDS)) {
+            const input = document.getElementById(inputId);
+            if (!input) continue;
+            let value = input.value;
+            if (NUMERIC_FIELDS.includes(field)) value = parseInt(value, 10) || 0;
+            else if (field.endsWith("_color") && value.startsWith("rgb")) value = rgbToHex(value);
+            else if (field === "bg_image") value = value || null;
+            fields[field] = value;
+        }
+        return fields;
+    }
+
+    function autosave() {
+        timer = null;
+        if (stopped) return;
+        if (inFlight) {
+            rerun = true;
+            return;
+        }
+        const fields = currentFields();
+        const changes = {};
+        for (const [field, value] of Object.entries(fields)) {
+            if (value === saved[field] || (field in rejected && rejected[field] === value)) continue;
+            changes[field] = value;
+        }
+        if (!Object.keys(changes).length) return;
+
+        inFlight = true;
+        autosaveStatus.textContent = "Saving…";
+        fetch(cardForm.dataset.cardUrl, {
+            method: "PATCH",
+            credentials: "same-origin",
+            keepalive: true,
+            headers: { "Content-Type": "application/json", "If-Match": etag },
+            body: JSON.stringify(changes),
+        })
+            .then(response => response.json().then(data => {
+                if (response.ok) {
+                    etag = response.headers.get("ETag");
+                    Object.assign(saved, changes);
+                    for (const field of Object.keys(changes)) markRejected(field, false);
+                    autosaveStatus.textContent = Object.keys(rejected).length
+                        ? "Other changes saved; fix the highlighted field to save it too."
+                        : "All changes saved";
+                } else if (response.status === 400 && data.fields && data.fields.length) {
+                    // Set the bad values aside and save the rest of the edit on the next pass
+                    for (const field of data.fields) {
+                        if (field in changes) rejected[field] = changes[field];
+                        markRejected(field, true);
+                    }
+                    autosaveStatus.textContent = data.error;
+                    rerun = true;
+                } else if (response.status === 412) {
+                    stopped = true;
+                    autosaveStatus.textContent = "This card was changed in another window. Reload to keep editing.";
+                } else {
+                    autosaveStatus.textContent = data.error || "Could not save your changes.";
+                }
+            }))
+            .catch(() => {
+                autosaveStatus.textContent = "Offline – changes not saved yet.";
+            })
+            .finally(() => {
+                inFlight = false;
+                if (rerun) {
+                    rerun = false;
+                    scheduleAutosave();
+                }
+            });
+    }
+
+    function markRejected(field, invalid) {
+        if (!invalid) delete rejected[field];
+        const input = document.getElementById(AUTOSAVE_FIELDS[field]);
+        if (!input) return;
+        // Hidden inputs mirror a visible control; flag that one when there is one
+        const control = input.type === "hidden" ? document.getElementById(AUTOSAVE_FIELDS[field].replace(/-input$/, "")) || input : input;
+        if (invalid) control.setAttribute("aria-invalid", "true");
+        else control.removeAttribute("aria-invalid");
+        control.style.outline = invalid ? "2px solid #ef4444" : "";
+    }
+
+    function scheduleAutosave() {
+        // Nothing to compare against until the controls have been initialised
+        if (!saved || stopped) return;
+        clearTimeout(timer);
+        timer = setTimeout(autosave, AUTOSAVE_DELAY);
+    }
+
+    ["input", "change", "click"].forEach(type => cardForm.addEventListener(type, scheduleAutosave));
+    preview.addEventListener("mouseup", scheduleAutosave);
+    document.addEventListener("keyup", scheduleAutosave);
+    document.addEventListener("visibilitychange", function () {
+        if (document.visibilityState === "hidden" && timer) {
+            clearTimeout(timer);
+            autosave();
+        }
+    });
+    cardForm.addEventListener("submit", function () {
+        clearTimeout(timer);
+        stopped = true;
+    });
+
+    // After loadSavedStyles() and initializeControls() have filled in the controls
+    setTimeout(() => { saved = currentFields(); }, 300);
+}
+
 /* ================================================= */
 /* ================= INITIALIZE CONTROLS =========== */
 /* ================================================= */
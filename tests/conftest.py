@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as cardhub  # noqa: E402
+import migrations  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path):
+    """An app on a fresh SQLite file built by the migrations, with every instance directory under tmp_path."""
+    dirs = ("CACHE_DIR", "THUMBNAIL_DIR", "BLOB_DIR", "EXPORT_DIR", "PENDING_UPLOAD_DIR", "METRICS_DIR",
+            "FRAGMENT_CACHE_DIR", "JINJA_CACHE_DIR")
+    application = cardhub.create_app({
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'cardhub.db'}",
+        "TESTING": True,
+        **{key: str(tmp_path / key.lower()) for key in dirs},
+    })
+    with application.app_context():
+        migrations.upgrade(cardhub.db.engine, cardhub.db.metadata)
+        cardhub.seed_data()
+        yield application
+        cardhub.db.session.remove()
@@ -0,0 +1,42 @@
+"""The query plans and budgets that `flask cardhub check-query-plans` enforces, on a small seeded database."""
+from datetime import datetime, timedelta
+
+import pytest
+
+import app as cardhub
+from app import Card, Review, Template, User, db
+
+
+@pytest.fixture
+def user(app):
+    """A user with more cards and reviews than fit on one profile page."""
+    user = User(username="alice", email="alice@example.com", password_hash="x")
+    db.session.add(user)
+    db.session.flush()
+    reviewed = Template.query.all()
+    started = datetime(2026, 1, 1)
+    for i in range(cardhub.PROFILE_PAGE_SIZE + 5):
+        # A template of its own per card, so a lazy load per card cannot hide behind the identity map
+        tpl = Template(name=f"Template {i}", category="Party", title_text="Party", line1_text="", line2_text="")
+        db.session.add(tpl)
+        db.session.flush()
+        db.session.add(Card(
+            user_id=user.id, template_id=tpl.id, title_text=f"Party {i}", line1_text="Saturday",
+            line2_text="At eight", created_at=started + timedelta(minutes=i),
+        ))
+        db.session.add(Review(
+            user_id=user.id, template_id=reviewed[i % len(reviewed)].id, rating=i % 5 + 1, comment="Lovely",
+            created_at=started + timedelta(minutes=i),
+        ))
+    db.session.commit()
+    return user.id
+
+
+def test_profile_statement_budget(app, user):
+    statements = cardhub.count_statements("/profile", user)
+    assert len(statements) <= cardhub.PROFILE_STATEMENT_BUDGET, "\n".join(statements)
+
+
+def test_hot_query_plans(app, user):
+    problems = {name: cardhub.query_plan_problems(query) for name, query in cardhub.hot_queries().items()}
+    assert {name: found for name, found in problems.items() if found} == {}